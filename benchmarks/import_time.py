@@ -0,0 +1,84 @@
+"""Import-time budget of the app and the render worker modules
+
+    python benchmarks/import_time.py --repeat 5
+
+Checked by tests/test_import_time.py as well.
+
+Imports each module in a fresh interpreter with `python -X importtime` (without
+GEMINI_API_KEY), takes the best cumulative time of the repeats and fails when a
+module is over its budget or pulls in one of the heavy dependencies that must
+only be imported on first use.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Module -> import-time budget in milliseconds
+BUDGETS = {
+    "manim_video_generator.render_pool": 200,
+    "manim_video_generator.warm_renderer": 250,
+    "manim_video_generator.video_executor": 300,
+    "manim_video_generator.batch": 350,
+    "demo": 500,
+}
+# Imported on first use only, a module importing any of these is a regression
+HEAVY_MODULES = ("moviepy", "manim", "manim_ml", "gradio", "google.genai", "google.generativeai")
+
+
+def import_time(module: str):
+    """Cumulative import time of the module in microseconds and every module it imported"""
+    env = {k: v for k, v in os.environ.items() if k != "GEMINI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    cumulative, imported = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        imported.add(name.strip())
+        if name.strip() == module:
+            cumulative = int(total)
+    return cumulative, imported
+
+
+def measure(module: str, repeat: int = 3):
+    """Best import time of the module in milliseconds and the heavy modules it imported"""
+    runs = [import_time(module) for _ in range(repeat)]
+    best = min(cumulative for cumulative, _ in runs) / 1000
+    heavy = sorted(
+        name for name in runs[0][1]
+        if any(name == h or name.startswith(h + ".") for h in HEAVY_MODULES)
+    )
+    return best, heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of the app modules against their budgets")
+    parser.add_argument("--modules", default="", help="comma separated, all budgeted modules by default")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    modules = args.modules.split(",") if args.modules else list(BUDGETS)
+    failures = 0
+    for module in modules:
+        best, heavy = measure(module, args.repeat)
+        budget = BUDGETS.get(module)
+        over = budget is not None and best > budget
+        status = "FAIL" if over or heavy else "ok"
+        print(f"{status:4} {module:40} {best:8.1f} ms  (budget {budget} ms)")
+        if heavy:
+            print(f"     imports {', '.join(heavy[:5])}{' ...' if len(heavy) > 5 else ''}")
+        failures += status == "FAIL"
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Offline benchmark of the render pipeline
+
+    python benchmarks/render_bench.py --qualities l,m --modes cli,warm --report bench.json
+
+Renders every scene of benchmarks/scenes with each execution mode and quality
+(no Gemini involved, render cache and session workspaces disabled) and writes a
+JSON report with render time, mux time, peak RSS of the render process tree and
+output size per run. Compare reports of two commits with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from manim_video_generator.metrics import metrics  # noqa: E402
+from manim_video_generator.render_pool import RenderJob  # noqa: E402
+from manim_video_generator.video_executor import VideoExecutor  # noqa: E402
+
+SCENES_DIR = Path(__file__).resolve().parent / "scenes"
+# Execution mode -> VideoExecutor settings
+MODES = {
+    "cli": {},
+    "warm": {"render_backend": "warm"},
+    "segmented": {"segment_workers": 4},
+    "moviepy": {"mux_mode": "moviepy"},
+}
+
+
+class TreeRssSampler:
+    """Peak resident memory of this process and all its descendants (Linux /proc)"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        page_mb = os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, self._tree_pages() * page_mb)
+            self._stop.wait(self.interval)
+
+    @staticmethod
+    def _tree_pages() -> int:
+        children, rss = {}, {}
+        for entry in Path("/proc").iterdir():
+            if not entry.name.isdigit():
+                continue
+            try:
+                stat = (entry / "stat").read_text()
+                statm = (entry / "statm").read_text()
+            except OSError:
+                continue  # exited meanwhile
+            # The command name may contain spaces, fields after it are fixed
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry.name))
+            rss[int(entry.name)] = int(statm.split()[1])
+        total, stack = 0, [os.getpid()]
+        while stack:
+            pid = stack.pop()
+            total += rss.get(pid, 0)
+            stack.extend(children.get(pid, ()))
+        return total
+
+
+def peak_rss_fallback_mb() -> float:
+    """Without /proc: the largest single process seen so far (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return usage / scale
+
+
+def run_once(executor: VideoExecutor, code: str, quality: str) -> dict:
+    job = RenderJob(code, session_id=f"bench-{uuid.uuid4().hex[:8]}")
+    started = time.monotonic()
+    if Path("/proc/self/stat").exists():
+        with TreeRssSampler() as sampler:
+            video = executor.execute_manim_code(code, job=job, quality=quality)
+        peak_mb = sampler.peak_mb
+    else:
+        video = executor.execute_manim_code(code, job=job, quality=quality)
+        peak_mb = peak_rss_fallback_mb()
+    spans = {record["event"]: record["seconds"] for record in metrics.get_trace(job.session_id)}
+    result = {
+        "total_s": round(time.monotonic() - started, 3),
+        "render_s": spans.get("render"),
+        "mux_s": spans.get("mux"),
+        "peak_rss_mb": round(peak_mb, 1),
+        "size_bytes": video.stat().st_size,
+    }
+    video.unlink()
+    return result
+
+
+def summarize(runs: list) -> dict:
+    summary = {}
+    for key in runs[0]:
+        values = [r[key] for r in runs if r[key] is not None]
+        summary[key] = round(statistics.median(values), 3) if values else None
+    return summary
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path: Path, new_path: Path):
+    """Print the change of the median timings between two reports"""
+    def index(report):
+        return {(r["scene"], r["mode"], r["quality"]): r["median"] for r in report["results"]}
+
+    old, new = json.loads(old_path.read_text()), json.loads(new_path.read_text())
+    print(f"{old['commit']} -> {new['commit']}")
+    old_results = index(old)
+    for key, median in index(new).items():
+        before = old_results.get(key)
+        if not before:
+            continue
+        changes = []
+        for metric in ("total_s", "render_s", "mux_s", "peak_rss_mb", "size_bytes"):
+            if before.get(metric) and median.get(metric) is not None:
+                changes.append(f"{metric} {100 * (median[metric] / before[metric] - 1):+.1f}%")
+        print(f"{'/'.join(key)}: {', '.join(changes)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the render pipeline on a fixed scene corpus")
+    parser.add_argument("--scenes", default="", help="comma separated scene names, all by default")
+    parser.add_argument("--modes", default="cli", help=f"comma separated, any of {', '.join(MODES)}")
+    parser.add_argument("--qualities", default="l,m")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1, help="unrecorded runs per mode (warm worker start-up)")
+    parser.add_argument("--report", type=Path, default=Path("bench_report.json"))
+    parser.add_argument("--compare", type=Path, help="earlier report to compare the new one with")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)  # the background music is looked up relative to the repository
+    scenes = sorted(SCENES_DIR.glob("*.py"))
+    if args.scenes:
+        scenes = [SCENES_DIR / f"{name}.py" for name in args.scenes.split(",")]
+    qualities = args.qualities.split(",")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="manim_bench_") as output_dir:
+        for mode in args.modes.split(","):
+            settings = dict(MODES[mode])
+            mux_mode = settings.pop("mux_mode", "ffmpeg")
+            executor = VideoExecutor(
+                output_dir=output_dir, max_workers=1, cache_dir=None, workspace_dir=None, timings_file=None,
+                **settings,
+            )
+            executor.mux_mode = mux_mode
+            try:
+                for _ in range(args.warmup):
+                    run_once(executor, scenes[0].read_text(), qualities[0])
+                for scene in scenes:
+                    code = scene.read_text()
+                    for quality in qualities:
+                        runs = [run_once(executor, code, quality) for _ in range(args.repeat)]
+                        median = summarize(runs)
+                        print(f"{scene.stem}/{mode}/{quality}: {median}")
+                        results.append(
+                            {"scene": scene.stem, "mode": mode, "quality": quality, "median": median, "runs": runs}
+                        )
+            finally:
+                if executor.warm_pool is not None:
+                    executor.warm_pool.shutdown()
+                executor.pool.shutdown()
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    args.report.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {args.report}")
+    if args.compare:
+        compare(args.compare, args.report)
+
+
+if __name__ == "__main__":
+    main()
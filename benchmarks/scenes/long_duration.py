@@ -0,0 +1,17 @@
+from manim import *
+
+
+class VideoScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[0, 10, 1], y_range=[-1.5, 1.5, 0.5], tips=False)
+        graph = axes.plot(lambda x: np.sin(x), color=BLUE)
+        self.play(Create(axes), run_time=2)
+        self.play(Create(graph), run_time=4)
+        dot = Dot(color=YELLOW).move_to(axes.c2p(0, 0))
+        self.add(dot)
+        self.play(MoveAlongPath(dot, graph), run_time=8, rate_func=linear)
+        square = Square().to_corner(UR)
+        self.play(Create(square))
+        self.play(Rotate(square, 2 * PI), run_time=6)
+        self.play(FadeOut(axes, graph, dot, square), run_time=2)
+        self.wait(3)
@@ -0,0 +1,14 @@
+from manim import *
+from manim_ml.neural_network import FeedForwardLayer, NeuralNetwork
+
+
+class VideoScene(Scene):
+    def construct(self):
+        network = NeuralNetwork(
+            [FeedForwardLayer(3), FeedForwardLayer(5), FeedForwardLayer(5), FeedForwardLayer(2)],
+            layer_spacing=0.6,
+        )
+        network.move_to(ORIGIN)
+        self.play(Create(network), run_time=2)
+        self.play(network.make_forward_pass_animation(), run_time=4)
+        self.wait(1)
@@ -0,0 +1,15 @@
+from manim import *
+
+
+class VideoScene(Scene):
+    def construct(self):
+        dots = VGroup(*[
+            Dot(radius=0.05, color=interpolate_color(BLUE, RED, (x + y) / 60)).move_to([x * 0.4 - 6, y * 0.4 - 3.4, 0])
+            for x in range(31)
+            for y in range(18)
+        ])
+        self.play(LaggedStartMap(FadeIn, dots, lag_ratio=0.002), run_time=2)
+        self.play(dots.animate.shift(UP * 0.5).scale(0.8), run_time=2)
+        self.play(Rotate(dots, PI / 6), run_time=2)
+        self.play(dots.animate.arrange_in_grid(rows=18, buff=0.1), run_time=2)
+        self.wait(1)
@@ -0,0 +1,15 @@
+from manim import *
+
+
+class VideoScene(Scene):
+    def construct(self):
+        title = Text("Gradient Descent", font_size=56).to_edge(UP)
+        self.play(Write(title))
+        lines = VGroup(*[
+            Text(f"Step {i}: move against the gradient by a learning rate", font_size=24)
+            for i in range(1, 9)
+        ]).arrange(DOWN, aligned_edge=LEFT).next_to(title, DOWN)
+        for line in lines:
+            self.play(FadeIn(line, shift=RIGHT), run_time=0.5)
+        self.play(lines.animate.set_color(YELLOW), run_time=1)
+        self.wait(1)
@@ -23,29 +23,104 @@ python gradio_manim_gemini_app.py
 from __future__ import annotations
 
 import asyncio
+import functools
 import os
-import re
-import traceback
+import uuid
 from pathlib import Path
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 
-import gradio as gr
-from google import genai
-from google.genai.chats import Chat, AsyncChat
-from google.genai.types import GenerateContentConfig, ThinkingConfig, UploadFileConfig
+if TYPE_CHECKING:
+    import gradio as gr
+    from google import genai
+    from google.genai.chats import AsyncChat
 
 from manim_video_generator.video_executor import VideoExecutor  # type: ignore
+from manim_video_generator.render_pool import RenderCancelled, RenderJob  # type: ignore
+from manim_video_generator.render_limits import RenderLimitError  # type: ignore
+from manim_video_generator.gemini_uploads import VideoUploader  # type: ignore
+from manim_video_generator.context_manager import ConversationContext, estimate_tokens  # type: ignore
+from manim_video_generator.error_normalizer import ErrorTracker, normalize_error  # type: ignore
+from manim_video_generator.code_validator import CodeValidationError, find_problems, validate_scene_code  # type: ignore
+from manim_video_generator.code_extraction import CodeBlockParser, extract_code  # type: ignore
+from manim_video_generator.speculative import first_success  # type: ignore
+from manim_video_generator.metrics import metrics  # type: ignore
+from manim_video_generator.llm_cache import LLMCache  # type: ignore
+from manim_video_generator.scheduler import QUALITY_LADDER, RenderPlan, RenderScheduler  # type: ignore
+from manim_video_generator.session_store import SessionStore, compact_history  # type: ignore
 from prompts import SYSTEM_PROMPT_SCENARIO_GENERATOR, SYSTEM_PROMPT_CODEGEN
 
 # ────────────────────────────────  Config  ─────────────────────────────────────
 
 API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise EnvironmentError("GEMINI_API_KEY env variable not set.")
-
-client = genai.Client(api_key=API_KEY)
 MODEL = "gemini-2.5-flash-preview-05-20"
-video_executor = VideoExecutor()
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_POLL_INTERVAL = 0.5  # seconds between queue position updates
+BACKGROUND_POLL_INTERVAL = 2  # seconds between checks for finished final renders
+PREVIEW_QUALITY = os.getenv("PREVIEW_QUALITY", "l")  # fast preview before the final render, empty disables it
+SKIP_FINAL_ON_FEEDBACK = os.getenv("SKIP_FINAL_ON_FEEDBACK", "1") == "1"
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))  # >1 races several implementations
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", "cache/renders")  # empty string disables the cache
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "cli")  # cli | warm
+METRICS_PORT = os.getenv("METRICS_PORT")  # serves /metrics and /traces/<session_id> when set
+VIDEO_HTTP_PORT = os.getenv("VIDEO_HTTP_PORT")  # serves rendered videos with range requests when set
+SESSION_STATE_DIR = os.getenv("SESSION_STATE_DIR", "cache/session_state")
+SESSION_MAX_MESSAGES = 40  # chat messages kept in a session snapshot
+SCENE_BUDGET = os.getenv("SCENE_BUDGET", "warn")  # warn | reject | off, about scenes outside 5-30 s
+ADAPTIVE_QUALITY = os.getenv("ADAPTIVE_QUALITY", "0") == "1"
+HQ_RERENDER = os.getenv("HQ_RERENDER", "0") == "1"  # re-render degraded videos once the renderer is idle
+HQ_RERENDER_MAX_WAIT = 600  # seconds to wait for an idle renderer before giving up
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "cache/llm")  # empty string disables the response cache
+llm_cache = (
+    LLMCache(
+        LLM_CACHE_DIR,
+        ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+        mode=os.getenv("LLM_CACHE_MODE", "read_write"),  # read_write | record | replay
+    )
+    if LLM_CACHE_DIR
+    else None
+)
+video_executor = VideoExecutor(
+    max_workers=RENDER_WORKERS,
+    cache_dir=RENDER_CACHE_DIR or None,
+    render_backend=RENDER_BACKEND,
+    segment_workers=int(os.getenv("SEGMENT_WORKERS", "1")),
+    output_max_bytes=int(float(os.getenv("OUTPUT_MAX_GB", "5")) * 1024 ** 3),
+)
+
+# Live sessions are bounded, idle ones are kept as snapshots on disk (shared by all workers)
+session_store = SessionStore(
+    SESSION_STATE_DIR,
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+    max_live=int(os.getenv("SESSION_MAX_LIVE", "500")),
+)
+
+# Pick the final render quality from the pool load and the scene's length (opt-in)
+render_scheduler = (
+    RenderScheduler(
+        video_executor.pool,
+        target_quality=video_executor.quality,
+        estimator=video_executor.estimator,
+        backend=RENDER_BACKEND,
+    )
+    if ADAPTIVE_QUALITY
+    else None
+)
+
+
+# google-genai and gradio are imported on first use, importing this module stays cheap
+
+@functools.lru_cache(maxsize=None)
+def get_client() -> genai.Client:
+    from google import genai
+
+    if not API_KEY:
+        raise EnvironmentError("GEMINI_API_KEY env variable not set.")
+    return genai.Client(api_key=API_KEY)
+
+
+@functools.lru_cache(maxsize=None)
+def get_uploader() -> VideoUploader:
+    return VideoUploader(get_client())
 
 # ───────────────────────  Helpers to work with Chatbot  ─────────────────────────
 
@@ -60,6 +135,14 @@ def append_bot_chunk(history: List[Tuple[str, str]], chunk: str):
     history[-1] = (user, bot + chunk)
 
 
+def replace_bot_tail(history: List[Tuple[str, str]], old: str, new: str):
+    """Replace a trailing status line of the bot part (append if it is not there)."""
+    user, bot = history[-1]
+    if old and bot.endswith(old):
+        bot = bot[: -len(old)]
+    history[-1] = (user, bot + new)
+
+
 class StreamPart:
     def __init__(self, text: str):
         self.text = text
@@ -68,81 +151,497 @@ class ThinkingStreamPart(StreamPart): pass
 class TextStreamPart(StreamPart): pass
 
 
-async def stream_parts(chat, prompt):
-    cfg = GenerateContentConfig(thinking_config=ThinkingConfig(include_thoughts=True))
-    async for chunk in await chat.send_message_stream(prompt, config=cfg):
-        if chunk.candidates:
-            cand = chunk.candidates[0]
-            if cand.content and cand.content.parts:
-                for part in cand.content.parts:
-                    if part.text:
-                        if part.thought:
-                            yield ThinkingStreamPart(part.text)
-                        else:
-                            yield TextStreamPart(part.text)
+async def stream_parts(chat, prompt, session_id: str | None = None):
+    from google.genai.types import Content, GenerateContentConfig, Part, ThinkingConfig
 
+    cfg = GenerateContentConfig(thinking_config=ThinkingConfig(include_thoughts=True))
+    cache_key = None
+    if llm_cache is not None:
+        cache_key = llm_cache.key(MODEL, chat.get_history(), user_content(prompt), cfg)
+        cached = llm_cache.get(cache_key)
+        metrics.inc("llm_cache_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            for part in cached:
+                yield (ThinkingStreamPart if part["thought"] else TextStreamPart)(part["text"])
+            # The chat has to know the answer as if it had been streamed from the model
+            chat.record_history(
+                user_input=Content.model_validate(user_content(prompt)),
+                model_output=[Content(role="model", parts=[Part(text=p["text"], thought=p["thought"] or None) for p in cached])],
+                automatic_function_calling_history=[],
+                is_valid=True,
+            )
+            return
 
-def extract_python(md: str) -> str:
-    m = re.search(r"```python(.*?)```", md, re.S)
-    if not m:
-        raise ValueError("No ```python``` block found in model output.")
-    return m.group(1).strip()
+    recorded = []
+    loop = asyncio.get_running_loop()
+    started, first_token, tokens = loop.time(), None, 0
+    with metrics.span("llm", session_id, model=MODEL) as span:
+        async for chunk in await chat.send_message_stream(prompt, config=cfg):
+            if chunk.candidates:
+                cand = chunk.candidates[0]
+                if cand.content and cand.content.parts:
+                    for part in cand.content.parts:
+                        if part.text:
+                            if first_token is None:
+                                first_token = loop.time() - started
+                                metrics.observe("llm_ttft_seconds", first_token, model=MODEL)
+                            tokens += estimate_tokens(part.text)
+                            recorded.append({"text": part.text, "thought": bool(part.thought)})
+                            if part.thought:
+                                yield ThinkingStreamPart(part.text)
+                            else:
+                                yield TextStreamPart(part.text)
+        generating = loop.time() - started - (first_token or 0)
+        metrics.inc("llm_tokens_total", tokens, model=MODEL)
+        span.update(ttft=round(first_token or 0, 3), tokens=tokens, tokens_per_s=round(tokens / max(generating, 1e-3), 1))
+    if cache_key is not None and recorded:
+        llm_cache.put(cache_key, recorded)
 
 
 async def coding_cycle(state: "Session", history: List[Tuple[str, str]], prompt):
     """Generate code, render video and return once rendering succeeds."""
     while True:
-        async for chunk in stream_parts(state.chat, prompt):
-            append_bot_chunk(history, chunk.text)
-            yield history, state, state.last_video
-            await asyncio.sleep(0)
+        # Extra implementations are generated alongside the chat answer (opt-in)
+        extra_tasks = start_candidates(state, prompt, SPECULATIVE_CANDIDATES - 1)
+        parser, early_job = CodeBlockParser(), None
+        try:
+            async for chunk in stream_parts(state.chat, prompt, state.session_id):
+                append_bot_chunk(history, chunk.text)
+                if (
+                    isinstance(chunk, TextStreamPart)
+                    and parser.feed(chunk.text)
+                    and not find_problems(parser.code)
+                    and not (SCENE_BUDGET == "reject" and scene_budget(parser.code))
+                ):
+                    # Start rendering while the model is still writing whatever follows the code
+                    # (the final render is left to SKIP_FINAL_ON_FEEDBACK)
+                    video_executor.pool.cancel_session(state.session_id, exclude=state.final_job)
+                    early_job = submit_preview(state, parser.code)
+                yield history, state, state.last_video
+                await asyncio.sleep(0)
+        except BaseException:
+            cancel_tasks(extra_tasks)
+            if early_job is not None:
+                early_job.cancel()
+            raise
 
-        full_answer = history[-1][1]
         try:
-            py_code = extract_python(full_answer)
+            py_code = parser.close()
         except ValueError as e:
+            cancel_tasks(extra_tasks)
             err_msg = f"Error: {e}. Please wrap the code in ```python``` fence."
+            record_retry(state, "no_code")
             prompt = err_msg
             add_user_msg(history, err_msg)
             yield history, state, state.last_video
             continue
+        state.context.add_code(py_code)
 
+        # Catch obvious mistakes without paying for a manim start-up
+        codes, validation_error = [], None
         try:
-            append_bot_chunk(history, "\n⏳ Rendering... It can take a few minutes")
+            validate_scene_code(py_code)
+            codes.append(py_code)
+        except CodeValidationError as e:
+            validation_error = e
+        extra_codes = await collect_candidates(extra_tasks)
+        codes += [c for c in dict.fromkeys(extra_codes) if c not in codes and not find_problems(c)]
+        if not codes:
+            err_msg = (
+                f"Error, your code is not valid:\n{validation_error}\nPlease fix these problems and regenerate the code again."
+            )
+            record_retry(state, "invalid_code")
+            prompt = compact_chat(state, err_msg)
+            add_user_msg(history, err_msg)
             yield history, state, state.last_video
-            await asyncio.sleep(0)
-            video_path = video_executor.execute_manim_code(py_code)
+            continue
+
+        if SCENE_BUDGET != "off":
+            budget = {code: scene_budget(code) for code in codes}
+            if SCENE_BUDGET == "reject" and all(budget.values()):
+                err_msg = (
+                    f"Error, {budget[codes[0]]}. The video must be 5-30 seconds long, "
+                    "please change the scene accordingly and regenerate the code again."
+                )
+                record_retry(state, "budget")
+                prompt = compact_chat(state, err_msg)
+                add_user_msg(history, err_msg)
+                yield history, state, state.last_video
+                continue
+            if SCENE_BUDGET == "reject":
+                codes = [code for code in codes if not budget[code]]
+            elif budget[codes[0]]:
+                append_bot_chunk(history, f"\n⏱️ Heads-up: {budget[codes[0]]}.")
+                yield history, state, state.last_video
+
+        if codes[0] != state.context.latest_code:
+            # The chat answer was invalid, a candidate takes its place
+            state.context.add_code(codes[0])
+
+        # Only the latest code of a session is worth rendering
+        if early_job is None:
+            video_executor.pool.cancel_session(state.session_id, exclude=state.final_job)
+        jobs = [
+            early_job if i == 0 and early_job is not None else submit_preview(state, code, i)
+            for i, code in enumerate(codes)
+        ]
+        job, py_code = jobs[0], codes[0]
+        try:
+            if len(jobs) == 1:
+                async for out in follow_render(job, history, state, "preview" if PREVIEW_QUALITY else "video"):
+                    yield out
+            else:
+                append_bot_chunk(history, f"\n🏁 Rendering {len(jobs)} candidate implementations, the first to succeed wins")
+                yield history, state, state.last_video
+                winner = await first_success(jobs)
+                job, py_code = jobs[winner], codes[winner]
+                if py_code != state.context.latest_code:
+                    # Continue the conversation from the code that actually rendered
+                    state.context.add_code(py_code)
+                    restart_chat(state)
+            video_path = job.result()
             state.last_video = video_path
-        except Exception as e:
-            tb = traceback.format_exc(limit=10)
+            state.context.mark_rendered()
+            state.errors.reset()
+            # Ready on Gemini's side by the time the user types feedback
+            state.upload_task = get_uploader().prefetch(video_path)
+            if job.report.get("reused_segments"):
+                append_bot_chunk(
+                    history,
+                    f"\n♻️ Reused {job.report['reused_segments']} of {job.report['total_segments']} animations from the previous render",
+                )
+        except RenderCancelled:
+            return
+        except RenderLimitError as e:
             err_msg = (
-                f"Error, your code is not valid: {e}. Traceback: {tb}. Please fix this error and regenerate the code again."
+                f"Error, rendering was stopped: {e}. The scene is too heavy for the renderer, make it lighter "
+                "(fewer objects, shorter loops, 5-30 seconds in total) and regenerate the code again."
             )
-            prompt = err_msg
+            record_retry(state, "render_limit")
+            prompt = compact_chat(state, err_msg)
             add_user_msg(history, err_msg)
             yield history, state, state.last_video
             continue
+        except Exception as e:
+            # Only the exception and the failing lines of scene.py, not manim's whole output
+            error = normalize_error(str(e), py_code)
+            repeats = state.errors.record(error)
+            err_msg = f"Error, your code is not valid:\n{error.format()}\n"
+            if repeats > 1:
+                err_msg += f"This error has now happened {repeats} times, try a different approach. "
+            err_msg += "Please fix this error and regenerate the code again."
+            record_retry(state, "render_error")
+            prompt = compact_chat(state, err_msg)
+            add_user_msg(history, err_msg)
+            yield history, state, state.last_video
+            continue
+        finally:
+            # The session went away (or was interrupted) while rendering
+            for j in jobs:
+                j.cancel()
 
-        append_bot_chunk(history, "\n🎞️ Rendering done! Feel free to request changes or press **Next Step** to end.")
         state.phase = "await_feedback"
+        if not PREVIEW_QUALITY:
+            append_bot_chunk(history, "\n🎞️ Rendering done! Feel free to request changes or press **Next Step** to end.")
+            yield history, state, state.last_video
+            # Without a preview the only render already used the scheduled (maybe degraded) quality
+            if HQ_RERENDER and degraded(job):
+                start_background(state, hq_rerender(state, py_code))
+            return
+
+        append_bot_chunk(
+            history,
+            "\n👀 Preview is ready, the final video is rendering in the background. "
+            "Feel free to request changes already or press **Next Step** to end.",
+        )
         yield history, state, state.last_video
+        start_background(state, render_final(state, py_code))
         return
 
+
+def scene_budget(code: str) -> str | None:
+    """Why the scene doesn't fit the 5-30 s video budget, None if it does."""
+    return video_executor.estimator.check_budget(video_executor.estimator.estimate(code))
+
+
+def final_plan(code: str) -> RenderPlan | None:
+    """Quality of the full render for the current load, None to use the executor default."""
+    return render_scheduler.plan(code) if render_scheduler is not None else None
+
+
+def degraded(job: RenderJob) -> bool:
+    """The job renders below the scheduler's target quality."""
+    if render_scheduler is None or job.quality is None:
+        return False
+    return QUALITY_LADDER.index(job.quality) < QUALITY_LADDER.index(render_scheduler.target_quality)
+
+
+def start_background(state: "Session", coro):
+    """Run the final render outside of the handler, so the user can send feedback meanwhile."""
+    if state.background_task is not None:
+        state.background_task.cancel()  # still working on the video before the feedback
+    state.background_task = asyncio.create_task(coro)
+
+
+async def render_final(state: "Session", code: str):
+    """Full quality render of the previewed code, rendered again at the target quality later if degraded."""
+    plan = final_plan(code)
+    state.final_job = video_executor.submit(code, session_id=state.session_id, quality=plan and plan.quality)
+    if await final_render(state) and plan is not None and plan.degraded and HQ_RERENDER:
+        await hq_rerender(state, code)
+
+
+async def hq_rerender(state: "Session", code: str):
+    """Render the degraded final video again at the target quality once the renderer is idle."""
+    video = state.last_video
+    if not await render_scheduler.wait_for_idle(timeout=HQ_RERENDER_MAX_WAIT):
+        return
+    if state.last_video != video or state.phase != "await_feedback" or state.final_job is not None:
+        return  # the user moved on meanwhile
+    quality = render_scheduler.target_quality
+    state.notes.append(f"\n🔁 The renderer is idle again, rendering the video in {quality} quality.")
+    state.final_job = video_executor.submit(code, session_id=state.session_id, quality=quality)
+    await final_render(state)
+
+
+def record_retry(state: "Session", reason: str):
+    metrics.inc("retries_total", reason=reason)
+    metrics.trace(state.session_id, "retry", reason=reason)
+
+
+def restart_chat(state: "Session") -> str:
+    """Replace the chat with one built from the bounded context, return the pending prompt."""
+    *context, last = state.context.get_context_for_gemini()
+    state.chat = get_client().aio.chats.create(model=MODEL, history=context)
+    return last["parts"][0]["text"]
+
+
+def compact_chat(state: "Session", error: str) -> str:
+    """Record the failure, restart the chat from the bounded context and return the next prompt."""
+    state.context.add_error(error)
+    # Failed code blocks and tracebacks of earlier attempts are not sent again
+    return restart_chat(state)
+
+
+def submit_preview(state: "Session", code: str, candidate: int = 0) -> RenderJob:
+    """Queue the code for rendering at preview quality, candidates get their own workspace."""
+    return video_executor.submit(
+        code,
+        session_id=state.session_id,
+        quality=PREVIEW_QUALITY or (final_plan(code).quality if render_scheduler is not None else None),
+        workspace_id=f"{state.session_id}-{candidate}" if candidate else None,
+    )
+
+
+def user_content(prompt) -> dict:
+    """A chat prompt (text or [file, text]) as a content dict for models.generate_content."""
+    from google.genai.types import File
+
+    parts = prompt if isinstance(prompt, list) else [prompt]
+    return {
+        "role": "user",
+        "parts": [
+            {"file_data": {"file_uri": p.uri, "mime_type": p.mime_type}} if isinstance(p, File) else {"text": p}
+            for p in parts
+        ],
+    }
+
+
+def start_candidates(state: "Session", prompt, n: int) -> List[asyncio.Task]:
+    """Request n more implementations of the prompt in parallel with the chat answer."""
+    if n <= 0:
+        return []
+    # Snapshot the history before the chat answer gets appended to it
+    contents = [*state.chat.get_history(), user_content(prompt)]
+    return [
+        asyncio.create_task(get_client().aio.models.generate_content(model=MODEL, contents=contents))
+        for _ in range(n)
+    ]
+
+
+async def collect_candidates(tasks: List[asyncio.Task]) -> List[str]:
+    """Code of the candidate answers that contain a python block."""
+    codes = []
+    for response in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(response, BaseException):
+            continue
+        try:
+            codes.append(extract_code(response.text or ""))
+        except ValueError:
+            continue
+    return codes
+
+
+def cancel_tasks(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+
+
+async def follow_render(job: RenderJob, history: List[Tuple[str, str]], state: "Session", label: str):
+    """Report queue position and rendering status until the job finishes."""
+    last_position = None
+    progress_line = ""
+    while not job.done():
+        position = video_executor.pool.position(job)
+        if position != last_position:
+            if position:
+                append_bot_chunk(history, f"\n🕒 Waiting for a free renderer, position in queue: {position}")
+            elif position == 0:
+                append_bot_chunk(history, f"\n⏳ Rendering {label}... It can take a few minutes")
+            last_position = position
+            yield history, state, state.last_video
+        elif position == 0 and job.progress is not None and job.progress.frames:
+            new_line = f"\n📽️ {job.progress.describe()}"
+            if new_line != progress_line:
+                replace_bot_tail(history, progress_line, new_line)
+                progress_line = new_line
+                yield history, state, state.last_video
+        await asyncio.sleep(RENDER_POLL_INTERVAL)
+
+
+async def final_render(state: "Session") -> bool:
+    """Wait for the full quality render and swap it in for the preview, True if it was."""
+    job, preview = state.final_job, state.last_video
+    try:
+        video = await job.wait()
+    except RenderCancelled:
+        # Skipped because the user already asked for changes
+        return False
+    except Exception as e:
+        state.notes.append(f"\n⚠️ Final render failed ({e}), keeping the preview.")
+        return False
+    finally:
+        job.cancel()
+        if state.final_job is job:
+            state.final_job = None
+    if state.last_video != preview:
+        # Kept rendering after feedback, a newer video took the preview's place meanwhile
+        return False
+    state.last_video = video
+    state.upload_task = get_uploader().prefetch(video)
+    state.notes.append("\n🎞️ Final video is ready!")
+    return True
+
+
+def poll_background(history: List[Tuple[str, str]], state: "Session"):
+    """Report what the background renders did, unless a handler is streaming the chat right now."""
+    if state.handlers or not state.notes or not history:
+        return gr.skip(), gr.skip()
+    for note in state.notes:
+        append_bot_chunk(history, note)
+    state.notes.clear()
+    return history, state.last_video
+
 # ──────────────────────────  Session state  ────────────────────────────────────
 
 class Session(dict):
+    session_id: str
     phase: str  # await_task | coding_loop | await_feedback | finished
     chat: AsyncChat | None
     last_video: Path | None
+    final_job: RenderJob | None  # full quality render running after the preview
+    background_task: asyncio.Task | None  # final render and re-render, not owned by a handler
+    notes: List[str]  # chat lines from the background task, added by poll_background
+    handlers: int  # running handlers of the session, they own the chat history meanwhile
+    upload_task: asyncio.Task | None  # background upload of last_video to Gemini
+    context: ConversationContext  # bounded summary used to restart the chat in the fix loop
+    errors: ErrorTracker  # repeated render failures since the last successful render
+    released: bool  # the chat was dropped by the session store, revive() brings it back
+    files: dict  # uri -> expiration time of the videos uploaded to Gemini for the chat
 
     def __init__(self):
-        super().__init__(phase="await_task", chat=None, last_video=None)
+        session_id = uuid.uuid4().hex
+        super().__init__(
+            session_id=session_id, phase="await_task", chat=None, last_video=None, final_job=None, upload_task=None,
+            background_task=None, notes=[], handlers=0, context=None, errors=None, released=False, files={},
+        )
+        self.session_id = session_id
         self.phase = "await_task"
         self.chat = None
         self.last_video = None
+        self.final_job = None
+        self.background_task = None
+        self.notes = []
+        self.handlers = 0
+        self.upload_task = None
+        self.context = ConversationContext(instructions=SYSTEM_PROMPT_CODEGEN)
+        self.errors = ErrorTracker()
+        self.released = False
+        self.files = {}
+
+    def snapshot(self, transcript: List[Tuple[str, str]]) -> dict:
+        """Compact serializable state, enough to continue the session in another process."""
+        return {
+            "session_id": self.session_id,
+            "phase": self.phase,
+            "last_video": str(self.last_video) if self.last_video else None,
+            "chat": compact_history(self.chat.get_history(), SESSION_MAX_MESSAGES, self.files) if self.chat else None,
+            "files": self.files,
+            "context": self.context.to_dict(),
+            "transcript": [list(pair) for pair in transcript],
+        }
+
+    def restore(self, data: dict):
+        self.session_id = data["session_id"]
+        self.phase = data["phase"]
+        self.last_video = Path(data["last_video"]) if data["last_video"] else None
+        if self.last_video is not None and not self.last_video.exists():
+            # Rendered by another worker or evicted from the output store since, feedback goes without it
+            self.last_video = None
+        self.files = data.get("files", {})
+        # Uploads in the history may have expired since the snapshot was taken
+        history = compact_history(data["chat"], SESSION_MAX_MESSAGES, self.files) if data["chat"] is not None else None
+        self.chat = get_client().aio.chats.create(model=MODEL, history=history) if history is not None else None
+        self.context.update_from(data["context"])
+        self.released = False
+
+    def release(self):
+        """Drop the live chat (and its full history) to free memory."""
+        self.chat = None
+        self.released = True
+
+    def revive(self):
+        data = session_store.load(self.session_id)
+        if data is not None:
+            self.restore(data)
+        self.released = False
+
+
+def stored_session(handler):
+    """Keep the session checked out of the store while the handler runs, snapshot it afterwards."""
+    @functools.wraps(handler)
+    async def wrapper(*args):
+        history, state = args[-2] or [], args[-1]
+        if state.released:
+            state.revive()
+        session_store.checkout(state)
+        state.handlers += 1
+        try:
+            async for out in handler(*args):
+                history = out[0]
+                yield out
+        finally:
+            state.handlers -= 1
+            session_store.checkin(state, state.snapshot(history))
+    return wrapper
+
+
+def resume_session(state: Session, request: gr.Request):
+    """Continue the session given by ?session=<id>, e.g. after a restart or on another worker."""
+    session_id = request.query_params.get("session") if request else None
+    data = session_store.load(session_id) if session_id else None
+    if data is None:
+        note = f"Session `{state.session_id}`, add `?session={state.session_id}` to the URL to resume it later."
+        return [], state, None, note
+    state.restore(data)
+    note = f"Resumed session `{state.session_id}`."
+    if data["last_video"] and state.last_video is None:
+        note += " Its video is no longer available, the next change you ask for renders it again."
+    return data["transcript"], state, state.last_video, note
 
 # ────────────────────────  Main chat handler  ──────────────────────────────────
 
+@stored_session
 async def chat_handler(user_msg: str, history: List[Tuple[str, str]], state: Session):
     history = history or []
 
@@ -154,12 +653,17 @@ async def chat_handler(user_msg: str, history: List[Tuple[str, str]], state: Ses
     if state.phase == "await_task":
         if not state.chat:
             # First time - create chat and generate scenario
-            state.chat = client.aio.chats.create(model=MODEL)
+            state.chat = get_client().aio.chats.create(model=MODEL)
+            state.context.set_request(user_msg)
             scenario_prompt = f"{SYSTEM_PROMPT_SCENARIO_GENERATOR}\n\n{user_msg}"
-            async for txt in stream_parts(state.chat, scenario_prompt):
+            scenario = ""
+            async for txt in stream_parts(state.chat, scenario_prompt, state.session_id):
                 append_bot_chunk(history, txt.text)
+                if isinstance(txt, TextStreamPart):
+                    scenario += txt.text
                 yield history, state, state.last_video
                 await asyncio.sleep(0)
+            state.context.set_scenario(scenario)
             append_bot_chunk(history, "\n\n*(press **Next Step** to proceed to code generation)*")
             yield history, state, state.last_video
             return
@@ -170,10 +674,15 @@ async def chat_handler(user_msg: str, history: List[Tuple[str, str]], state: Ses
                 state.phase = "coding_loop"
             else:
                 # User wants to discuss/modify scenario
-                async for chunk in stream_parts(state.chat, user_msg):
+                state.context.add_clarification(user_msg)
+                scenario = ""
+                async for chunk in stream_parts(state.chat, user_msg, state.session_id):
                     append_bot_chunk(history, chunk.text)
+                    if isinstance(chunk, TextStreamPart):
+                        scenario += chunk.text
                     yield history, state, state.last_video
                     await asyncio.sleep(0)
+                state.context.set_scenario(scenario)
                 append_bot_chunk(history, "\n\n*(press **Next Step** when ready to proceed to code generation)*")
                 yield history, state, state.last_video
                 return
@@ -195,14 +704,15 @@ async def chat_handler(user_msg: str, history: List[Tuple[str, str]], state: Ses
             append_bot_chunk(history, "Session complete. Refresh page to start over.")
             yield history, state, state.last_video
             return
-        file_ref = client.files.upload(file=state.last_video, config=UploadFileConfig(display_name=state.last_video.name))
-        while file_ref.state and file_ref.state.name == "PROCESSING":
-            await asyncio.sleep(3)
-            if file_ref.name:
-                file_ref = client.files.get(name=file_ref.name)
-        if file_ref.state and file_ref.state.name == "FAILED":
-            raise RuntimeError("Gemini failed to process upload")
-        prompt = [file_ref, f"{user_msg}\n\n{SYSTEM_PROMPT_CODEGEN}"]
+        if SKIP_FINAL_ON_FEEDBACK and state.background_task is not None:
+            # The final render of a video the user wants changed is wasted work
+            state.background_task.cancel()
+        state.context.add_feedback(user_msg)
+        prompt = f"{user_msg}\n\n{SYSTEM_PROMPT_CODEGEN}"
+        if state.last_video is not None and state.last_video.exists():
+            file_ref = await get_uploader().get(state.last_video)
+            state.files[file_ref.uri] = file_ref.expiration_time.isoformat()
+            prompt = [file_ref, prompt]
         state.phase = "coding_loop"
         async for out in coding_cycle(state, history, prompt):
             yield out
@@ -213,6 +723,7 @@ async def chat_handler(user_msg: str, history: List[Tuple[str, str]], state: Ses
         append_bot_chunk(history, "Session complete. Refresh page to start over.")
         yield history, state, state.last_video
 
+@stored_session
 async def next_step_handler(history: List[Tuple[str, str]], state: Session):
     """Advance the conversation without typing control words."""
     history = history or []
@@ -235,11 +746,14 @@ async def next_step_handler(history: List[Tuple[str, str]], state: Session):
 # ───────────────────────────────  UI  ──────────────────────────────────────────
 
 def build_app():
+    global gr  # also resolves the gr.Request annotation of resume_session
+    import gradio as gr
+
     with gr.Blocks(title="Gemini‑Manim Video Creator") as demo:
         gr.Markdown("# 🎬 Gemini‑Manim Video Creator\nCreate an explanatory animation from a single prompt.")
 
         history = gr.Chatbot(height=850)
-        session = gr.State(Session())
+        session = gr.State(Session)  # callable -> a fresh Session (and id) per browser session
 
         with gr.Row():
             txt = gr.Textbox(placeholder="Describe the concept…", scale=4)
@@ -247,6 +761,7 @@ def build_app():
             next_btn = gr.Button("Next Step")
 
         vid = gr.Video(label="Rendered video", interactive=False)
+        session_note = gr.Markdown()
 
         def get_vid(state: Session):
             return state.last_video if state.last_video else None
@@ -255,9 +770,20 @@ def build_app():
            .then(lambda: "", None, txt)
 
         next_btn.click(next_step_handler, [history, session], [history, session, vid])
-
+        demo.load(resume_session, [session], [history, session, vid, session_note])
+        # Final renders finish after their handler has returned
+        gr.Timer(BACKGROUND_POLL_INTERVAL).tick(
+            poll_background, [history, session], [history, vid], show_progress="hidden"
+        )
+
+    # Renders are throttled by the render pool, not by Gradio's per-event queue
+    demo.queue(default_concurrency_limit=None)
     return demo
 
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+    if VIDEO_HTTP_PORT:
+        video_executor.outputs.serve(int(VIDEO_HTTP_PORT))
     build_app().launch()
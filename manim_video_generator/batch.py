@@ -0,0 +1,264 @@
+"""Headless batch generation of videos from a JSONL prompt list
+
+    python -m manim_video_generator.batch prompts.jsonl --output results.jsonl
+
+Every input line is a JSON object with a "prompt" (or "title" and "body") and an
+optional "id". Finished jobs are appended to the results file as they complete,
+so an interrupted batch continues where it stopped when started again.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Protocol
+
+from loguru import logger
+
+from .code_extraction import extract_code
+from .code_validator import find_problems
+from .context_manager import ConversationContext
+from .error_normalizer import normalize_error
+from .output_store import SAFE_NAME_RE
+from .render_limits import RenderLimitError
+from .video_executor import VideoExecutor
+from prompts import SYSTEM_PROMPT_CODEGEN, SYSTEM_PROMPT_SCENARIO_GENERATOR
+
+MAX_RETRY_DELAY = 60.0  # seconds between retries of a failed LLM call, at most
+NO_CODE_HINT = "Your last answer had no code block, please wrap the code in ```python``` fence."
+STUB_CODE = """from manim import *
+
+
+class VideoScene(Scene):
+    def construct(self):
+        title = Text("Hello from the batch runner")
+        self.play(Write(title))
+        self.play(title.animate.to_edge(UP))
+        circle = Circle(color=BLUE)
+        self.play(Create(circle))
+        self.wait(1)
+"""
+
+
+class LLM(Protocol):
+    async def generate(self, contents: List[dict], task: str) -> str:
+        """Answer for Gemini-style contents, task is 'scenario' or 'code'"""
+        ...
+
+
+class GeminiLLM:
+    def __init__(self, model: str, api_key: Optional[str] = None):
+        from google import genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise EnvironmentError("GEMINI_API_KEY env variable not set.")
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    async def generate(self, contents: List[dict], task: str) -> str:
+        response = await self.client.aio.models.generate_content(model=self.model, contents=contents)
+        return response.text or ""
+
+
+class StubLLM:
+    """Offline stand-in that answers every request with the same scenario and code"""
+
+    def __init__(self, code: str = STUB_CODE, delay: float = 0.0):
+        self.code = code
+        self.delay = delay
+
+    async def generate(self, contents: List[dict], task: str) -> str:
+        await asyncio.sleep(self.delay)
+        if task == "scenario":
+            request = contents[-1]["parts"][0]["text"].strip().splitlines()[-1]
+            return f"A short title card for: {request}"
+        return f"```python\n{self.code}\n```"
+
+
+def read_jobs(path: Path) -> List[dict]:
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            prompt = item.get("prompt") or "\n\n".join(filter(None, [item.get("title"), item.get("body")]))
+            job_id = str(item.get("id") or item.get("request_id") or n)
+            jobs.append({"id": job_id, "prompt": prompt})
+    return jobs
+
+
+def session_id_for(job_id: str) -> str:
+    """Path-safe session id of a job, distinct job ids keep distinct ids"""
+    digest = hashlib.sha1(job_id.encode("utf-8")).hexdigest()[:8]
+    return f"batch-{SAFE_NAME_RE.sub('_', job_id)[:48]}-{digest}"
+
+
+def read_checkpoint(path: Path, retry_failed: bool = False) -> set:
+    """Ids of jobs already recorded in the results file"""
+    done = set()
+    if not path.exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # the last line of a crashed run may be cut short
+            if result.get("status") == "ok" or not retry_failed:
+                done.add(result["id"])
+    return done
+
+
+class BatchRunner:
+    """Runs scenario -> code -> validate -> render (with music) for many prompts"""
+
+    def __init__(
+        self,
+        llm: LLM,
+        executor: VideoExecutor,
+        llm_concurrency: int = 4,
+        max_attempts: int = 5,
+        quality: Optional[str] = None,
+        llm_retries: int = 5,
+        retry_delay: float = 2.0,
+    ):
+        self.llm = llm
+        self.executor = executor
+        self.max_attempts = max_attempts
+        self.quality = quality
+        self.llm_retries = llm_retries
+        self.retry_delay = retry_delay
+        self._llm_slots = asyncio.Semaphore(llm_concurrency)
+        self._write_lock = asyncio.Lock()
+
+    async def _generate(self, contents: List[dict], task: str, timings: dict) -> str:
+        """Model answer, failed calls (rate limits, network errors) are retried with backoff"""
+        delay = self.retry_delay
+        for retry in range(self.llm_retries + 1):
+            async with self._llm_slots:
+                started = time.monotonic()
+                try:
+                    return await self.llm.generate(contents, task)
+                except Exception as e:
+                    if retry == self.llm_retries:
+                        raise
+                    logger.warning(f"LLM call for the {task} failed ({type(e).__name__}: {e}), retrying in {delay:.0f} s")
+                finally:
+                    timings[task] = timings.get(task, 0) + time.monotonic() - started
+            # Jitter keeps the jobs hit by the same rate limit from retrying in lockstep
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    async def run_job(self, job: dict) -> dict:
+        started = time.monotonic()
+        timings: dict = {}
+        result = {"id": job["id"], "status": "failed", "video": None, "attempts": 0, "error": None}
+        try:
+            context = ConversationContext(instructions=SYSTEM_PROMPT_CODEGEN)
+            context.set_request(job["prompt"])
+            message = {"role": "user", "parts": [{"text": f"{SYSTEM_PROMPT_SCENARIO_GENERATOR}\n\n{job['prompt']}"}]}
+            context.set_scenario(await self._generate([message], "scenario", timings))
+
+            for attempt in range(1, self.max_attempts + 1):
+                result["attempts"] = attempt
+                answer = await self._generate(context.get_context_for_gemini(), "code", timings)
+                try:
+                    code = extract_code(answer)
+                except ValueError as e:
+                    result["error"] = str(e)
+                    # The error of the latest code still has to be fixed, keep it
+                    if NO_CODE_HINT not in (context.latest_error or ""):
+                        context.add_error("\n\n".join(filter(None, [context.latest_error, NO_CODE_HINT])))
+                    continue
+                context.add_code(code)
+                problems = find_problems(code)
+                if problems:
+                    result["error"] = "\n".join(problems)
+                    context.add_error(f"The code is not valid:\n{result['error']}")
+                    continue
+
+                render_started = time.monotonic()
+                try:
+                    video = await self.executor.submit(code, session_id=session_id_for(job["id"]), quality=self.quality).wait()
+                except RenderLimitError as e:
+                    result["error"] = str(e)
+                    context.add_error(f"Rendering was stopped: {e}. Make the scene lighter.")
+                    continue
+                except Exception as e:
+                    error = normalize_error(str(e), code)
+                    result["error"] = error.format()
+                    context.add_error(result["error"])
+                    continue
+                finally:
+                    timings["render"] = timings.get("render", 0) + time.monotonic() - render_started
+
+                result.update(status="ok", video=str(video), error=None)
+                break
+        except Exception as e:
+            logger.exception(f"Batch job {job['id']} crashed")
+            result["error"] = f"{type(e).__name__}: {e}"
+
+        timings["total"] = time.monotonic() - started
+        result["timings"] = {k: round(v, 2) for k, v in timings.items()}
+        return result
+
+    async def _record(self, output: Path, result: dict):
+        async with self._write_lock:
+            with open(output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def run(self, jobs: Iterable[dict], output: Path, retry_failed: bool = False) -> List[dict]:
+        done = read_checkpoint(output, retry_failed)
+        pending = [job for job in jobs if job["id"] not in done]
+        logger.info(f"Batch: {len(pending)} jobs to run, {len(done)} already done")
+
+        async def one(job: dict) -> dict:
+            result = await self.run_job(job)
+            await self._record(output, result)
+            logger.info(f"Batch job {job['id']}: {result['status']} after {result['attempts']} attempts")
+            return result
+
+        return await asyncio.gather(*(one(job) for job in pending))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate videos for every prompt of a JSONL file")
+    parser.add_argument("input", type=Path, help="JSONL file with a prompt per line")
+    parser.add_argument("--output", type=Path, default=Path("results.jsonl"), help="results JSONL, also the checkpoint")
+    parser.add_argument("--output-dir", default="output", help="where rendered videos are stored")
+    parser.add_argument("--llm", choices=["gemini", "stub"], default="gemini")
+    parser.add_argument("--model", default="gemini-2.5-flash-preview-05-20")
+    parser.add_argument("--stub-code", type=Path, help="scene the stub LLM answers with")
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--render-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--llm-retries", type=int, default=5, help="retries of a failed LLM call, with backoff")
+    parser.add_argument("--quality", choices=["l", "m", "h", "p", "k"])
+    parser.add_argument("--retry-failed", action="store_true", help="run jobs that failed last time again")
+    args = parser.parse_args(argv)
+
+    if args.llm == "stub":
+        llm = StubLLM(args.stub_code.read_text() if args.stub_code else STUB_CODE)
+    else:
+        llm = GeminiLLM(args.model)
+    executor = VideoExecutor(output_dir=args.output_dir, max_workers=args.render_workers)
+    runner = BatchRunner(
+        llm, executor, args.llm_concurrency, args.max_attempts, args.quality, llm_retries=args.llm_retries
+    )
+    try:
+        results = asyncio.run(runner.run(read_jobs(args.input), args.output, args.retry_failed))
+    finally:
+        executor.pool.shutdown()
+    ok = sum(r["status"] == "ok" for r in results)
+    logger.info(f"Batch finished: {ok}/{len(results)} videos rendered, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import re
+from typing import List, Optional
+
+# Opening fence of a markdown code block: ```python, ``` py, ~~~, also after prose on the same line
+OPEN_FENCE_RE = re.compile(r"(`{3,}|~{3,})[ \t]*([\w+-]*)")
+PYTHON_LANGUAGES = ("python", "python3", "py")
+
+
+class CodeBlockParser:
+    """Incremental markdown fence parser for streamed model answers
+
+    Feed it the text parts of the answer as they arrive; `feed` returns the code
+    as soon as the closing fence of the first python block has been seen, so the
+    rest of the answer doesn't have to be waited for.
+    """
+
+    def __init__(self):
+        self.code: Optional[str] = None  # first complete python block
+        self.fallback: Optional[str] = None  # first complete block without a language
+        self._partial = ""
+        self._fence: Optional[str] = None
+        self._language = ""
+        self._lines: List[str] = []
+        self._text: List[str] = []  # everything fed, for unfenced answers
+
+    def feed(self, text: str) -> Optional[str]:
+        """Consume a chunk, return the code if its block has just been closed"""
+        self._text.append(text)
+        if self.code is not None:
+            return None
+        *lines, self._partial = (self._partial + text).split("\n")
+        for line in lines:
+            if self._line(line):
+                return self.code
+        return None
+
+    def _line(self, line: str) -> bool:
+        if self._fence is None:
+            match = OPEN_FENCE_RE.search(line)
+            if match is None:
+                return False
+            self._fence, self._language, self._lines = match.group(1), match.group(2).lower(), []
+            rest = line[match.end():]
+            # "```python x = 1```" - a block on a single line
+            return bool(rest.strip()) and self._line(rest)
+
+        end = line.find(self._fence)
+        if end < 0:
+            self._lines.append(line)
+            return False
+        # The fence closes the block wherever it is: "    self.wait()```", "``` Hope this helps!"
+        if line[:end].strip():
+            self._lines.append(line[:end])
+
+        code = "\n".join(self._lines).strip()
+        self._fence = None
+        if self._language in PYTHON_LANGUAGES:
+            self.code = code
+            return True
+        if not self._language and self.fallback is None:
+            self.fallback = code
+        return False
+
+    def close(self, lenient: bool = False) -> str:
+        """End of the answer: the python block, else an untagged one
+
+        With `lenient` an unclosed block or an answer without any fences is taken
+        as code too, for prompts that ask for nothing but code.
+        """
+        if self.code is None and self._partial:
+            self._line(self._partial)
+            self._partial = ""
+        if self.code is not None:
+            return self.code
+        if self.fallback is not None:
+            return self.fallback
+        if lenient:
+            if self._fence is not None and self._lines:
+                return "\n".join(self._lines).strip()
+            text = "".join(self._text).strip()
+            if text:
+                return text
+        raise ValueError("No ```python``` block found in model output.")
+
+
+def extract_code(text: str, lenient: bool = False) -> str:
+    """Code of the first python block of a complete answer"""
+    parser = CodeBlockParser()
+    parser.feed(text)
+    return parser.close(lenient)
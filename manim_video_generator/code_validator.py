@@ -0,0 +1,100 @@
+import ast
+from typing import List
+
+# Mobjects that are rendered through LaTeX, which is not installed on the render hosts
+LATEX_MOBJECTS = {
+    "MathTex", "Tex", "SingleStringMathTex", "Title", "BulletedList",
+    "DecimalNumber", "Integer", "Variable",
+    "Matrix", "IntegerMatrix", "DecimalMatrix",
+    "MathTable", "IntegerTable", "DecimalTable",
+}
+
+FORBIDDEN_MODULES = {
+    "os", "sys", "subprocess", "shutil", "socket", "ctypes", "multiprocessing",
+    "requests", "urllib", "http", "pickle", "importlib",
+}
+
+FORBIDDEN_CALLS = {"eval", "exec", "compile", "open", "input", "__import__", "breakpoint"}
+
+FORBIDDEN_METHODS = {"embed", "interactive_embed"}
+
+
+class CodeValidationError(ValueError):
+    """Generated code is known to fail before it gets rendered"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("\n".join(f"- {p}" for p in problems))
+
+
+def find_problems(code: str, scene_name: str = "VideoScene") -> List[str]:
+    """Statically check generated Manim code and return a list of problems"""
+    try:
+        tree = ast.parse(code, filename="scene.py")
+    except SyntaxError as e:
+        line = f"\n    {e.text.rstrip()}" if e.text else ""
+        return [f"SyntaxError at line {e.lineno}: {e.msg}{line}"]
+
+    problems = []
+
+    # The scene class must exist, be a Scene subclass and implement construct()
+    scene_classes: dict[str, ast.ClassDef] = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = [_base_name(b) for b in node.bases]
+            if any(b.endswith("Scene") or b in scene_classes for b in bases):
+                scene_classes[node.name] = node
+    scene = scene_classes.get(scene_name)
+    if scene is None:
+        found = ", ".join(scene_classes) or "none"
+        problems.append(f"No `{scene_name}(Scene)` class found (Scene subclasses in the code: {found})")
+    elif not _defines_construct(scene, scene_classes):
+        problems.append(f"`{scene_name}` has no `construct(self)` method")
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] in FORBIDDEN_MODULES:
+                    problems.append(f"Line {node.lineno}: importing `{alias.name}` is not allowed")
+        elif isinstance(node, ast.ImportFrom):
+            if node.module and node.module.split(".")[0] in FORBIDDEN_MODULES:
+                problems.append(f"Line {node.lineno}: importing from `{node.module}` is not allowed")
+        elif isinstance(node, ast.Call):
+            name = _base_name(node.func)
+            if isinstance(node.func, ast.Name) and name in FORBIDDEN_CALLS:
+                problems.append(f"Line {node.lineno}: calling `{name}()` is not allowed")
+            elif isinstance(node.func, ast.Attribute) and name in FORBIDDEN_METHODS:
+                problems.append(f"Line {node.lineno}: `{name}()` opens an interactive shell and is not allowed")
+            elif name in LATEX_MOBJECTS:
+                problems.append(
+                    f"Line {node.lineno}: `{name}` requires LaTeX which is not available, "
+                    f"use Text() with Unicode symbols instead"
+                )
+    return problems
+
+
+def validate_scene_code(code: str, scene_name: str = "VideoScene"):
+    """Raise CodeValidationError if the code can not render successfully"""
+    problems = find_problems(code, scene_name)
+    if problems:
+        raise CodeValidationError(problems)
+
+
+def _defines_construct(cls: ast.ClassDef, scene_classes: dict) -> bool:
+    """construct() defined on the class or on one of its scene base classes from the same file"""
+    if any(isinstance(n, ast.FunctionDef) and n.name == "construct" for n in cls.body):
+        return True
+    return any(
+        _defines_construct(scene_classes[name], scene_classes)
+        for name in (_base_name(b) for b in cls.bases)
+        if name in scene_classes and name != cls.name
+    )
+
+
+def _base_name(node: ast.AST) -> str:
+    """`Scene` for both `Scene` and `manim.Scene`"""
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return ""
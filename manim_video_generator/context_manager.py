@@ -0,0 +1,148 @@
+from typing import List, Optional
+
+from loguru import logger
+
+# Rough size of a Gemini token for English text and Python code
+CHARS_PER_TOKEN = 4
+# Long errors and scenarios are cut down to this many characters when over budget
+MAX_TRIMMED_CHARS = 1000
+TRIM_MARK = "\n...\n"
+
+
+# Attributes saved with a session, see ConversationContext.to_dict
+STATE_FIELDS = ("request", "clarifications", "scenario", "latest_code", "latest_error", "feedback", "attempts")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationContext:
+    """Bounded conversation state for the code generation prompts
+
+    Instead of the whole chat it keeps the request, the agreed scenario, the latest
+    code with its latest error and one-line summaries of older failed attempts,
+    trimmed to a token budget.
+    """
+
+    def __init__(self, instructions: str = "", max_tokens: int = 6000, max_attempts: int = 5):
+        self.instructions = instructions
+        self.max_tokens = max_tokens
+        self.max_attempts = max_attempts
+        self.request: str = ""
+        self.clarifications: List[str] = []
+        self.scenario: Optional[str] = None
+        self.latest_code: Optional[str] = None
+        self.latest_error: Optional[str] = None
+        self.feedback: Optional[str] = None
+        self.attempts: List[str] = []  # summaries of older failed attempts, oldest first
+
+    def set_request(self, text: str):
+        """The video request, a different one starts over without the old scenario and code"""
+        text = text.strip()
+        if self.request and text != self.request:
+            self.clarifications, self.scenario = [], None
+            self.latest_code = self.latest_error = self.feedback = None
+            self.attempts = []
+        self.request = text
+
+    def add_clarification(self, text: str):
+        """User remarks made while discussing the scenario"""
+        self.clarifications.append(text.strip())
+
+    def set_scenario(self, text: str):
+        self.scenario = text.strip()
+
+    def add_feedback(self, text: str):
+        """User remarks about the latest rendered video"""
+        self.feedback = text.strip()
+
+    def add_code(self, code: str):
+        """New code from the model, the previous failed attempt becomes a summary"""
+        if self.latest_code is not None and self.latest_error is not None:
+            self.attempts.append(self._summarize(self.latest_error))
+            self.attempts = self.attempts[-self.max_attempts:]
+        self.latest_code = code.strip()
+        self.latest_error = None
+
+    def mark_rendered(self):
+        """The latest code rendered fine, failures and feedback before it are settled"""
+        self.latest_error = None
+        self.feedback = None
+        self.attempts = []
+
+    def add_error(self, error: str, code: Optional[str] = None):
+        """The latest code (or the given one) failed with the error"""
+        if code is not None and code.strip() != self.latest_code:
+            self.add_code(code)
+        self.latest_error = error.strip()
+
+    def to_dict(self) -> dict:
+        """Serializable state, instructions and budgets come from the constructor"""
+        return {field: getattr(self, field) for field in STATE_FIELDS}
+
+    def update_from(self, data: dict):
+        """Restore the state saved by to_dict"""
+        for field in STATE_FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
+
+    @staticmethod
+    def _summarize(error: str) -> str:
+        lines = [line.strip() for line in error.strip().splitlines() if line.strip()]
+        # The exception line is usually the last one
+        summary = lines[-1] if lines else "unknown error"
+        return summary[:200]
+
+    def get_context_for_gemini(self) -> List[dict]:
+        """Messages in Gemini's content format, the last one is always from the user"""
+        attempts = list(self.attempts)
+        error = self.latest_error
+        scenario = self.scenario
+        while True:
+            messages = self._build(scenario, attempts, error)
+            tokens = sum(estimate_tokens(m["parts"][0]["text"]) for m in messages)
+            if tokens <= self.max_tokens:
+                break
+            # Give up the least useful information first
+            if attempts:
+                attempts.pop(0)
+            elif error and len(error) > MAX_TRIMMED_CHARS + len(TRIM_MARK):
+                error = TRIM_MARK + error[-MAX_TRIMMED_CHARS:]
+            elif scenario and len(scenario) > MAX_TRIMMED_CHARS + len(TRIM_MARK):
+                scenario = scenario[:MAX_TRIMMED_CHARS] + TRIM_MARK
+            else:
+                logger.warning(f"Context is still {tokens} tokens, over the {self.max_tokens} budget")
+                break
+        logger.debug(f"Context for Gemini: {len(messages)} messages, ~{tokens} tokens")
+        return messages
+
+    def _build(self, scenario: Optional[str], attempts: List[str], error: Optional[str]) -> List[dict]:
+        intro = [self.instructions] if self.instructions else []
+        intro.append(f"Video request: {self.request}")
+        if self.clarifications:
+            intro.append("Clarifications:\n" + "\n".join(f"- {c}" for c in self.clarifications))
+        if scenario:
+            intro.append(f"Agreed scenario:\n{scenario}")
+        if self.latest_code is None and error:
+            intro.append(error)  # the answers so far had no code at all
+        messages = [_message("user", "\n\n".join(intro))]
+        if self.latest_code is None:
+            return messages
+
+        messages.append(_message("model", f"```python\n{self.latest_code}\n```"))
+        follow_up = []
+        if self.feedback:
+            follow_up.append(f"User feedback on the rendered video:\n{self.feedback}")
+        if attempts:
+            follow_up.append("Earlier attempts failed with:\n" + "\n".join(f"- {a}" for a in attempts))
+        if error:
+            follow_up.append(f"The code above fails with:\n{error}\n\nPlease fix this error and regenerate the code again.")
+        else:
+            follow_up.append("Please update the code accordingly.")
+        messages.append(_message("user", "\n\n".join(follow_up)))
+        return messages
+
+
+def _message(role: str, text: str) -> dict:
+    return {"role": role, "parts": [{"text": text}]}
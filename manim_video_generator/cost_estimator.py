@@ -0,0 +1,269 @@
+import ast
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from .segmented_render import NON_PLAYING_METHODS
+
+# Frame rates and resolutions of the `manim -q` presets
+QUALITY_FPS = {"l": 15, "m": 30, "h": 60, "p": 60, "k": 60}
+QUALITY_RESOLUTION = {"l": (854, 480), "m": (1280, 720), "h": (1920, 1080), "p": (2560, 1440), "k": (3840, 2160)}
+# Video length asked for in SYSTEM_PROMPT_SCENARIO_GENERATOR
+MIN_SECONDS, MAX_SECONDS = 5, 30
+
+# Uncalibrated render time model (seconds), see CostEstimator.model_seconds
+STARTUP_SECONDS = 4.0  # importing manim and writing the final file
+SECONDS_PER_MEGAPIXEL_FRAME = 0.03
+SECONDS_PER_ANIMATION = 0.3  # partial movie file per play/wait
+OBJECTS_PER_DOUBLING = 50  # scenes with this many mobjects take about twice as long per frame
+
+
+@dataclass
+class SceneEstimate:
+    seconds: Optional[float]  # playing time, None if the code can't be analysed
+    animations: int = 0
+    objects: int = 0
+    exact: bool = False  # no loops, branches or computed durations that could make it longer
+
+    def frames(self, quality: str) -> int:
+        return int((self.seconds or 0) * QUALITY_FPS.get(quality, 60))
+
+    def megapixel_frames(self, quality: str) -> float:
+        width, height = QUALITY_RESOLUTION.get(quality, QUALITY_RESOLUTION["h"])
+        return self.frames(quality) * width * height / 1e6
+
+
+def analyze_scene(code: str, scene_name: str = "VideoScene") -> SceneEstimate:
+    """Playing time, animation and mobject counts of construct() from self.play/self.wait calls
+
+    Loops with unknown bounds count once and branches as their cheapest outcome, so
+    the estimate rather under- than overshoots.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return SceneEstimate(None)
+    scene = next((n for n in tree.body if isinstance(n, ast.ClassDef) and n.name == scene_name), None)
+    construct = scene and next((n for n in scene.body if isinstance(n, ast.FunctionDef) and n.name == "construct"), None)
+    if construct is None:
+        return SceneEstimate(None)
+    seconds, animations, objects = _block(construct.body)
+    return SceneEstimate(seconds, animations, objects, _is_exact(construct))
+
+
+def estimate_duration(code: str, scene_name: str = "VideoScene") -> Optional[float]:
+    """Conservative scene length in seconds, None if the code can't be analysed"""
+    return analyze_scene(code, scene_name).seconds
+
+
+def _block(body: list) -> tuple:
+    totals = [0.0, 0, 0]
+    for stmt in body:
+        for i, value in enumerate(_stmt(stmt)):
+            totals[i] += value
+    return tuple(totals)
+
+
+def _stmt(stmt: ast.stmt) -> tuple:
+    if isinstance(stmt, ast.For):
+        count = _loop_count(stmt.iter)
+        return tuple(count * value for value in _block(stmt.body))
+    if isinstance(stmt, (ast.While, ast.With)):
+        return _block(stmt.body)
+    if isinstance(stmt, ast.If):
+        return min(_block(stmt.body), _block(stmt.orelse))
+    if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+        seconds = _call_duration(stmt.value)
+        if seconds is not None:
+            return seconds, 1, 0
+    # Mobjects built outside of animations: Circle(), Text("..."), VGroup(...)
+    objects = sum(
+        1 for node in ast.walk(stmt)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id[:1].isupper()
+    )
+    return 0.0, 0, objects
+
+
+def _call_duration(call: ast.Call) -> Optional[float]:
+    """Seconds played by a self.play/self.wait call, None for any other call"""
+    func = call.func
+    if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "self"):
+        return None
+    if func.attr == "play":
+        return _number(_keyword(call, "run_time"), 1.0)
+    if func.attr in ("wait", "pause"):
+        arg = call.args[0] if call.args else _keyword(call, "duration")
+        return _number(arg, 1.0)
+    return None
+
+
+def _is_exact(construct: ast.FunctionDef) -> bool:
+    for node in ast.walk(construct):
+        if isinstance(node, (ast.While, ast.If, ast.IfExp)):
+            return False
+        if isinstance(node, ast.For) and not _literal_iterations(node.iter):
+            return False
+        if not isinstance(node, ast.Call):
+            continue
+        if any(isinstance(arg, ast.Name) and arg.id == "self" for arg in node.args):
+            return False  # the scene is handed to a helper that may play animations
+        func = node.func
+        if not (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "self"):
+            continue
+        if func.attr == "play":
+            duration = _keyword(node, "run_time")
+        elif func.attr in ("wait", "pause"):
+            duration = node.args[0] if node.args else _keyword(node, "duration")
+        elif func.attr in NON_PLAYING_METHODS:
+            continue
+        else:
+            return False  # a helper method of the scene
+        if duration is not None and _number(duration, None) is None:
+            return False
+    return True
+
+
+def _literal_iterations(node: ast.expr) -> bool:
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return True
+    return (
+        isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"
+        and bool(node.args) and all(_number(a, None) is not None for a in node.args)
+    )
+
+
+def _loop_count(node: ast.expr) -> int:
+    """Iterations of `range(...)` with literal bounds or of a literal sequence, 1 if unknown"""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return len(node.elts)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range":
+        args = [_number(a, None) for a in node.args]
+        if args and None not in args:
+            try:
+                return len(range(*(int(a) for a in args)))
+            except ValueError:
+                return 1
+    return 1
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.expr]:
+    return next((k.value for k in call.keywords if k.arg == name), None)
+
+
+def _number(node: Optional[ast.expr], default):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return float(node.value)
+    return default
+
+
+class CostEstimator:
+    """Predicts render times from the static scene estimate, calibrated with recorded renders
+
+    Every finished render is appended to `timings_file`; the model's prediction is
+    scaled per backend by the least-squares factor between predicted and measured times.
+    Only the latest `max_samples` renders per backend are kept, in memory and in the file.
+    """
+
+    def __init__(self, timings_file: Optional[str] = "cache/render_timings.jsonl", max_samples: int = 500):
+        self.timings_file = Path(timings_file) if timings_file else None
+        self.max_samples = max_samples
+        self._samples: dict = {}  # backend -> [(model seconds, measured seconds)]
+        self._lock = threading.Lock()
+        self._file_samples = 0
+        for sample in self._read_timings():
+            self._add_sample(sample["backend"], sample["model"], sample["seconds"])
+            self._file_samples += 1
+
+    def _read_timings(self) -> list:
+        if self.timings_file is None or not self.timings_file.exists():
+            return []
+        samples = []
+        for line in self.timings_file.read_text(encoding="utf-8").splitlines():
+            try:
+                samples.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return samples
+
+    def estimate(self, code: str, scene_name: str = "VideoScene") -> SceneEstimate:
+        return analyze_scene(code, scene_name)
+
+    @staticmethod
+    def model_seconds(estimate: SceneEstimate, quality: str) -> float:
+        per_frame = SECONDS_PER_MEGAPIXEL_FRAME * (1 + estimate.objects / OBJECTS_PER_DOUBLING)
+        return (
+            STARTUP_SECONDS
+            + estimate.megapixel_frames(quality) * per_frame
+            + estimate.animations * SECONDS_PER_ANIMATION
+        )
+
+    def scale(self, backend: str = "cli") -> float:
+        with self._lock:
+            samples = self._samples.get(backend)
+            if not samples:
+                return 1.0
+            return sum(m * s for m, s in samples) / sum(m * m for m, _ in samples)
+
+    def render_seconds(self, estimate: SceneEstimate, quality: str, backend: str = "cli") -> float:
+        """Predicted wall time of the render"""
+        return self.model_seconds(estimate, quality) * self.scale(backend)
+
+    def record(self, estimate: SceneEstimate, quality: str, backend: str, seconds: float):
+        """Calibrate with the measured wall time of a finished render"""
+        if estimate.seconds is None:
+            return
+        model = self.model_seconds(estimate, quality)
+        predicted = model * self.scale(backend)
+        self._add_sample(backend, model, seconds)
+        logger.info(f"Render took {seconds:.1f} s, predicted {predicted:.1f} s ({backend}, {quality})")
+        if self.timings_file is None:
+            return
+        sample = {"backend": backend, "quality": quality, "model": round(model, 3), "seconds": round(seconds, 3)}
+        with self._lock:
+            self.timings_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.timings_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(sample) + "\n")
+            self._file_samples += 1
+            # Trimmed to at most max_samples per backend, rewritten once it has grown to twice that
+            if self._file_samples > 2 * self.max_samples * len(self._samples):
+                self._trim_timings()
+
+    def _trim_timings(self):
+        """Rewrite the timings file with the latest max_samples renders per backend"""
+        samples, kept = self._read_timings(), {}
+        latest = []
+        for sample in reversed(samples):
+            kept[sample["backend"]] = kept.get(sample["backend"], 0) + 1
+            if kept[sample["backend"]] <= self.max_samples:
+                latest.append(sample)
+        latest.reverse()
+        tmp_path = self.timings_file.with_suffix(".tmp")
+        tmp_path.write_text("".join(json.dumps(sample) + "\n" for sample in latest), encoding="utf-8")
+        os.replace(tmp_path, self.timings_file)
+        self._file_samples = len(latest)
+
+    def _add_sample(self, backend: str, model: float, seconds: float):
+        with self._lock:
+            samples = self._samples.setdefault(backend, [])
+            samples.append((model, seconds))
+            del samples[:-self.max_samples]
+
+    @staticmethod
+    def check_budget(estimate: SceneEstimate, min_seconds: float = MIN_SECONDS, max_seconds: float = MAX_SECONDS) -> Optional[str]:
+        """Why the scene is outside the video length budget, None if it fits (or is unknown)
+
+        The estimate is a lower bound, so a scene is only called too short when its
+        length is known exactly.
+        """
+        if estimate.seconds is None:
+            return None
+        if estimate.seconds > max_seconds:
+            return f"the scene plays for at least {estimate.seconds:.0f} s, more than the {max_seconds} s limit"
+        if estimate.exact and estimate.seconds < min_seconds:
+            return f"the scene plays for only about {estimate.seconds:.0f} s, less than the {min_seconds} s minimum"
+        return None
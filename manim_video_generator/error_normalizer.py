@@ -0,0 +1,95 @@
+import hashlib
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+# Frames of the generated file in plain (File "scene.py", line 5) and rich (scene.py:5 in construct) tracebacks
+PLAIN_FRAME_RE = re.compile(r'File "[^"]*scene\.py", line (\d+)(?:, in (\w+))?')
+RICH_FRAME_RE = re.compile(r"scene\.py:(\d+) in (\w+)")
+EXCEPTION_RE = re.compile(r"^((?:[A-Za-z_]\w*\.)*[A-Za-z_]\w*(?:Error|Exception|Exit|Interrupt|Warning))(?::\s*(.*))?$")
+PROGRESS_RE = re.compile(r"\d+%\||it/s\]")
+BOX_CHARS = "│┃║|╭╮╰╯─━ "
+
+
+@dataclass
+class NormalizedError:
+    exc_type: str
+    message: str
+    line: Optional[int] = None
+    function: Optional[str] = None
+    source: str = ""  # numbered lines of scene.py around the failing one
+
+    @property
+    def key(self) -> str:
+        """Identity of the failure that survives code moving around or object addresses changing"""
+        message = re.sub(r"0x[0-9a-fA-F]+", "0x", self.message)
+        failing_line = next((l for l in self.source.splitlines() if l.startswith(">")), "")
+        failing_line = failing_line.split("|", 1)[-1].strip()
+        return hashlib.sha1(f"{self.exc_type}|{message}|{failing_line}".encode()).hexdigest()[:16]
+
+    def format(self) -> str:
+        text = f"{self.exc_type}: {self.message}" if self.message else self.exc_type
+        if self.line is not None:
+            where = f" in {self.function}()" if self.function else ""
+            text += f"\nat scene.py line {self.line}{where}:\n{self.source}"
+        return text
+
+
+def _clean_lines(output: str) -> list:
+    lines = []
+    for raw in ANSI_RE.sub("", output).replace("\r", "\n").splitlines():
+        if PROGRESS_RE.search(raw):
+            continue
+        line = raw.strip(BOX_CHARS)
+        if line:
+            lines.append(line)
+    return lines
+
+
+def _source_excerpt(code: str, line: int, context: int = 2) -> str:
+    code_lines = code.splitlines()
+    start, end = max(1, line - context), min(len(code_lines), line + 1)
+    return "\n".join(
+        f"{'>' if n == line else ' '}{n:4d} | {code_lines[n - 1]}" for n in range(start, end + 1)
+    )
+
+
+def normalize_error(output: str, code: str) -> NormalizedError:
+    """Reduce manim/Python error output to the exception, its location in scene.py and the source there"""
+    lines = _clean_lines(output)
+
+    exc_type, message = "Error", lines[-1] if lines else "unknown error"
+    for i in range(len(lines) - 1, -1, -1):
+        match = EXCEPTION_RE.match(lines[i])
+        if match:
+            exc_type, message = match.group(1), (match.group(2) or "").strip()
+            break
+
+    line, function = None, None
+    frames = [*PLAIN_FRAME_RE.finditer(output), *RICH_FRAME_RE.finditer(output)]
+    if frames:
+        # The innermost frame of the generated code is the interesting one, it is printed last
+        innermost = max(frames, key=lambda m: m.start())
+        line, function = int(innermost.group(1)), innermost.group(2)
+
+    error = NormalizedError(exc_type, message[:500], line, function)
+    if line is not None and 0 < line <= len(code.splitlines()):
+        error.source = _source_excerpt(code, line)
+    return error
+
+
+class ErrorTracker:
+    """Counts repeated identical failures across the attempts of a session"""
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+
+    def record(self, error: NormalizedError) -> int:
+        """Remember the error, return how many times it has been seen"""
+        self.counts[error.key] += 1
+        return self.counts[error.key]
+
+    def reset(self):
+        self.counts.clear()
@@ -1,27 +1,50 @@
 import os
-import google.generativeai as genai
 from loguru import logger
 from dotenv import load_dotenv
 from typing import Optional, TYPE_CHECKING
-import re
+
+from .code_extraction import extract_code
 
 if TYPE_CHECKING:
     from .context_manager import ConversationContext
+    from .llm_cache import LLMCache
 
 load_dotenv()
 
 
 class GeminiClient:
-    def __init__(self, api_key: str = None, context_manager: Optional['ConversationContext'] = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        context_manager: Optional['ConversationContext'] = None,
+        response_cache: Optional['LLMCache'] = None,
+    ):
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
+        import google.generativeai as genai
+
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash-thinking-exp")
+        self.model_name = "gemini-2.0-flash-thinking-exp"
+        self.model = genai.GenerativeModel(self.model_name)
         self.context_manager = context_manager
+        self.response_cache = response_cache
         logger.info("Gemini client initialized")
 
+    def _generate(self, messages: list) -> str:
+        """Answer text for the messages, from the response cache when possible"""
+        key = None
+        if self.response_cache is not None:
+            key = self.response_cache.key(self.model_name, messages[:-1], messages[-1])
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return "".join(part["text"] for part in cached if not part["thought"])
+        text = self.model.generate_content(messages).text
+        if key is not None:
+            self.response_cache.put(key, [{"text": text, "thought": False}])
+        return text
+
     def generate_manim_code(self, user_request: str) -> str:
         """Generate Manim code based on the user's request"""
         
@@ -64,12 +87,14 @@ IMPORTANT:
 - Focus on creating visually appealing animations that demonstrate the requested concept"""
 
         # Получаем контекст предыдущих сообщений
-        messages = []
         if self.context_manager:
+            if not self.context_manager.instructions:
+                self.context_manager.instructions = system_prompt
+            # A new request drops the code and failed attempts of the previous one
+            self.context_manager.set_request(f"Create a video for the request: {user_request}")
             messages = self.context_manager.get_context_for_gemini()
-        
-        # Добавляем системный промпт и текущий запрос если истории нет
-        if not messages:
+        else:
+            # Добавляем системный промпт и текущий запрос если истории нет
             messages = [
                 {"role": "user", "parts": [{"text": f"{system_prompt}\n\nCreate a video for the request: {user_request}"}]}
             ]
@@ -80,35 +105,13 @@ IMPORTANT:
             logger.debug(f"Message {i+1} ({message['role']}): {message['parts'][0]['text'][:200]}{'...' if len(message['parts'][0]['text']) > 200 else ''}")
 
         logger.info(f"Sending request to Gemini with {len(messages)} context messages")
-        response = self.model.generate_content(messages)
+        response_text = self._generate(messages)
         
         # Extract code from the response
-        code = response.text.strip()
-        
-        # Улучшенное извлечение кода
-        if code.startswith("```python"):
-            # Стандартный случай: код начинается с ```python
-            code = code[9:]
-            if code.endswith("```"):
-                code = code[:-3]
-        elif code.startswith("```"):
-            # Код начинается с ```
-            code = code[3:]
-            if code.endswith("```"):
-                code = code[:-3]
-        else:
-            # Ищем первый блок кода внутри текста
-            python_match = re.search(r'```python\s*\n(.*?)\n```', code, re.DOTALL)
-            if python_match:
-                code = python_match.group(1)
-            else:
-                # Ищем любой блок ```
-                code_match = re.search(r'```\s*\n(.*?)\n```', code, re.DOTALL)
-                if code_match:
-                    code = code_match.group(1)
-                # Если нет блоков кода, оставляем как есть (весь ответ)
-        
-        code = code.strip()
+        # The prompt asks for bare code, so an answer without fences is taken as is
+        code = extract_code(response_text, lenient=True)
+        if self.context_manager:
+            self.context_manager.add_code(code)
         logger.info("Manim code generated successfully")
         return code
 
@@ -116,12 +119,14 @@ IMPORTANT:
         """Fix Manim code using the error trace and optional user hint"""
         
         # Получаем контекст
-        messages = []
         if self.context_manager:
+            # Older attempts are collapsed into summaries, only the latest error is sent in full
+            self.context_manager.add_error(error_trace, current_code)
+            if user_hint:
+                self.context_manager.add_feedback(user_hint)
             messages = self.context_manager.get_context_for_gemini()
-        
-        # Если контекста нет, создаем базовое сообщение
-        if not messages:
+        else:
+            # Если контекста нет, создаем базовое сообщение
             hint_block = f"\nUser hint: {user_hint}" if user_hint else ""
             prompt = f"""
 You are an assistant that helps fix errors in Manim code.
@@ -145,33 +150,11 @@ Provide the corrected code. Return ONLY the Python code without explanations.
             logger.debug(f"Message {i+1} ({message['role']}): {message['parts'][0]['text'][:200]}{'...' if len(message['parts'][0]['text']) > 200 else ''}")
 
         logger.info("Sending code fix request to Gemini")
-        response = self.model.generate_content(messages)
-
-        fixed = response.text.strip()
-
-        # Улучшенное извлечение кода
-        if fixed.startswith("```python"):
-            # Стандартный случай: код начинается с ```python
-            fixed = fixed[9:]
-            if fixed.endswith("```"):
-                fixed = fixed[:-3]
-        elif fixed.startswith("```"):
-            # Код начинается с ```
-            fixed = fixed[3:]
-            if fixed.endswith("```"):
-                fixed = fixed[:-3]
-        else:
-            # Ищем первый блок кода внутри текста
-            python_match = re.search(r'```python\s*\n(.*?)\n```', fixed, re.DOTALL)
-            if python_match:
-                fixed = python_match.group(1)
-            else:
-                # Ищем любой блок ```
-                code_match = re.search(r'```\s*\n(.*?)\n```', fixed, re.DOTALL)
-                if code_match:
-                    fixed = code_match.group(1)
-                # Если нет блоков кода, оставляем как есть (весь ответ)
-
-        fixed = fixed.strip()
+        response_text = self._generate(messages)
+
+        # The prompt asks for bare code, so an answer without fences is taken as is
+        fixed = extract_code(response_text, lenient=True)
+        if self.context_manager:
+            self.context_manager.add_code(fixed)
         logger.info("Received fixed code from Gemini")
         return fixed
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from google.genai.types import File
+
+# Gemini keeps uploaded files for 48 hours
+DEFAULT_TTL = timedelta(hours=47)
+# Don't hand out a file that is about to expire while the model is still reading it
+EXPIRY_MARGIN = timedelta(minutes=10)
+
+
+class VideoUploader:
+    """Uploads rendered videos to the Gemini Files API once and reuses the handle
+
+    Uploads are keyed by the video content, start in the background as soon as a
+    video is rendered and wait for processing with exponential backoff.
+    """
+
+    def __init__(self, client, initial_delay: float = 0.5, max_delay: float = 5.0, timeout: float = 300):
+        self.client = client
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._files: dict[str, File] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _digest(path: Path) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def prefetch(self, path: Path) -> asyncio.Task:
+        """Start uploading in the background, the returned task must be kept referenced"""
+        task = asyncio.create_task(self.get(path))
+        task.add_done_callback(self._log_failure)
+        return task
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background video upload failed: {task.exception()}")
+
+    async def get(self, path: Path) -> File:
+        """Return a processed Gemini file for the video, uploading it if needed"""
+        digest = await asyncio.to_thread(self._digest, path)
+        file_ref = self._files.get(digest)
+        if file_ref is not None and self._valid(file_ref):
+            logger.info(f"Reusing uploaded video {file_ref.name} for {path.name}")
+            return file_ref
+
+        task = self._tasks.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._upload(path, digest))
+            self._tasks[digest] = task
+            task.add_done_callback(lambda _: self._tasks.pop(digest, None))
+        # One caller going away must not cancel the upload shared with the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _valid(file_ref: File) -> bool:
+        expires = file_ref.expiration_time
+        return expires is None or expires - EXPIRY_MARGIN > datetime.now(timezone.utc)
+
+    async def _upload(self, path: Path, digest: str) -> File:
+        with metrics.span("upload"):
+            return await self._upload_and_wait(path, digest)
+
+    async def _upload_and_wait(self, path: Path, digest: str) -> File:
+        from google.genai.types import UploadFileConfig
+
+        logger.info(f"Uploading video to Gemini: {path}")
+        file_ref = await self.client.aio.files.upload(file=path, config=UploadFileConfig(display_name=path.name))
+
+        delay = self.initial_delay
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while file_ref.state and file_ref.state.name == "PROCESSING":
+            if loop.time() > deadline:
+                raise TimeoutError(f"Gemini is still processing {file_ref.name} after {self.timeout} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_delay)
+            file_ref = await self.client.aio.files.get(name=file_ref.name)
+        if file_ref.state and file_ref.state.name == "FAILED":
+            raise RuntimeError("Gemini failed to process upload")
+
+        if file_ref.expiration_time is None:
+            file_ref.expiration_time = datetime.now(timezone.utc) + DEFAULT_TTL
+        self._files = {d: f for d, f in self._files.items() if self._valid(f)}
+        self._files[digest] = file_ref
+        logger.info(f"Video uploaded to Gemini: {file_ref.name}")
+        return file_ref
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+MODES = ("read_write", "record", "replay")
+
+
+class LLMCacheMiss(LookupError):
+    """Replay mode found no recorded response for a request"""
+
+
+def _jsonable(value):
+    """Plain JSON data of google-genai models (Content, configs, ...) and containers of them"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+class LLMCache:
+    """On-disk cache of model responses, replayed as the original sequence of parts
+
+    Entries are keyed by everything the answer depends on (model, history, prompt,
+    config) and store the thought and text parts in order, so a hit can be streamed
+    like a live answer. Modes: 'read_write' answers from the cache and records misses,
+    'record' always calls the model and overwrites, 'replay' never calls the model and
+    raises LLMCacheMiss instead (deterministic offline runs).
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "cache/llm",
+        max_bytes: int = 200 * 1024 ** 2,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        mode: str = "read_write",
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode {mode!r}, expected one of {MODES}")
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.mode = mode
+        self._lock = threading.Lock()
+        logger.info(f"LLM response cache initialized: {self.cache_dir} ({mode})")
+
+    @staticmethod
+    def key(model: str, history, prompt, config=None) -> str:
+        payload = json.dumps(
+            {"model": model, "history": _jsonable(history), "prompt": _jsonable(prompt), "config": _jsonable(config)},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Recorded parts ({'text', 'thought'}) for the key, or None when the model has to be called"""
+        if self.mode == "record":
+            return None
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+        if entry is not None and self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            path.unlink(missing_ok=True)
+            entry = None
+        if entry is None:
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No recorded response for {key[:12]}")
+            return None
+        # Touch the entry so that eviction is least-recently-used
+        os.utime(path)
+        logger.info(f"LLM cache hit: {key[:12]}")
+        return entry["parts"]
+
+    def put(self, key: str, parts: List[dict]):
+        """Record a complete response"""
+        if self.mode == "replay":
+            return
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"created": time.time(), "parts": parts}), encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self.cache_dir.glob("*.json"), key=lambda f: f.stat().st_mtime)
+            total = sum(f.stat().st_size for f in entries)
+            while entries and total > self.max_bytes:
+                oldest = entries.pop(0)
+                total -= oldest.stat().st_size
+                oldest.unlink(missing_ok=True)
+                logger.info(f"LLM cache evicted: {oldest.name}")
@@ -0,0 +1,81 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+# tqdm bar printed by manim for every animation, e.g.
+# "Animation 2: Write(Text('Hi')):  47%|####7     | 14/30 [00:00<00:00, 27.56it/s]"
+PROGRESS_RE = re.compile(r"Animation (\d+)\s*:.*?\|\s*(\d+)/(\d+) \[[^<\]]*<[^,\]]*(?:,\s*([\d.]+)\s*it/s)?")
+TRACEBACK_RE = re.compile(r"Traceback \(most recent call last\)")
+# Last line of a traceback: "NameError: name 'x' is not defined" (outside rich's │ box)
+EXCEPTION_RE = re.compile(r"^(?:[\w.]+\.)?\w*(?:Error|Exception|Exit|Interrupt)\b(?::|$)")
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+
+@dataclass
+class RenderProgress:
+    animation: int = 0  # 0-based index of the animation being rendered
+    total_animations: Optional[int] = None
+    frame: int = 0
+    frames: int = 0  # frames of the current animation
+    fps: Optional[float] = None
+    eta: Optional[float] = None  # seconds until the whole scene is rendered
+
+    def describe(self) -> str:
+        total = f"/{self.total_animations}" if self.total_animations else ""
+        parts = [f"animation {self.animation + 1}{total}"]
+        if self.fps:
+            parts.append(f"{self.fps:.1f} frames/s")
+        if self.eta is not None:
+            parts.append(f"~{self.eta:.0f} s left")
+        return ", ".join(parts)
+
+
+class ProgressParser:
+    """Incrementally parse manim output split by tqdm's carriage returns"""
+
+    def __init__(self, total_animations: Optional[int] = None):
+        self.progress = RenderProgress(total_animations=total_animations)
+        self.lines: List[str] = []
+        self.traceback_seen = False
+        self.exception_seen = False
+        self._partial = ""
+        self._started = time.monotonic()
+
+    def feed(self, data: str) -> bool:
+        """Consume a chunk of output, return True if the progress changed"""
+        chunks = re.split(r"[\r\n]", self._partial + data)
+        self._partial = chunks.pop()
+        changed = False
+        for chunk in chunks:
+            changed |= self._line(ANSI_RE.sub("", chunk))
+        return changed
+
+    def _line(self, line: str) -> bool:
+        if not line.strip():
+            return False
+        match = PROGRESS_RE.search(line)
+        if match:
+            self._update(int(match.group(1)), int(match.group(2)), int(match.group(3)), match.group(4))
+            return True
+        # Progress bar redraws are noise, everything else is kept for error reports
+        self.lines.append(line)
+        if TRACEBACK_RE.search(line):
+            self.traceback_seen = True
+        elif self.traceback_seen and EXCEPTION_RE.match(line.strip()):
+            self.exception_seen = True
+        return False
+
+    def _update(self, animation: int, frame: int, frames: int, fps: Optional[str]):
+        p = self.progress
+        p.animation, p.frame, p.frames = animation, frame, frames
+        if fps:
+            p.fps = float(fps)
+        if p.total_animations and frames:
+            done = (animation + frame / frames) / p.total_animations
+            elapsed = time.monotonic() - self._started
+            p.eta = elapsed * (1 - done) / done if done > 0 else None
+
+    @property
+    def output(self) -> str:
+        return "\n".join(self.lines + ([self._partial] if self._partial else []))
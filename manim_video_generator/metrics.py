@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+# Seconds, from a cache hit to a slow 4k render
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+PREFIX = "manim_gpt"
+
+
+class Metrics:
+    """In-process timing spans, exported as Prometheus text and per-session traces"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_sessions: int = 1000, max_spans: int = 500):
+        self.buckets = buckets
+        self.max_sessions = max_sessions
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        # (name, labels) -> [bucket counts..., sum, count]
+        self._histograms: Dict[Tuple[str, tuple], list] = {}
+        self._traces: Dict[str, deque] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[name, tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = name, tuple(sorted(labels.items()))
+        with self._lock:
+            hist = self._histograms.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def trace(self, session_id: Optional[str], event: str, **fields):
+        """Append a record to the session's trace"""
+        if session_id is None:
+            return
+        record = {"ts": round(time.time(), 3), "event": event, **fields}
+        with self._lock:
+            spans = self._traces.pop(session_id, None) or deque(maxlen=self.max_spans)
+            spans.append(record)
+            # Most recently active sessions last, the oldest one goes first
+            self._traces[session_id] = spans
+            if len(self._traces) > self.max_sessions:
+                del self._traces[next(iter(self._traces))]
+
+    @contextmanager
+    def span(self, stage: str, session_id: Optional[str] = None, **fields):
+        """Time a pipeline stage into stage_seconds{stage=...} and the session trace"""
+        started = time.monotonic()
+        status = "ok"
+        try:
+            yield fields
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self.observe("stage_seconds", elapsed, stage=stage, status=status)
+            self.trace(session_id, stage, seconds=round(elapsed, 3), status=status, **fields)
+
+    def get_trace(self, session_id: str) -> list:
+        with self._lock:
+            return list(self._traces.get(session_id, ()))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        for name in sorted({n for n, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name} counter")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{PREFIX}_{name}{_labels(labels)} {value:g}")
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}_{name} histogram")
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(self.buckets, hist):
+                    lines.append(f"{PREFIX}_{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{PREFIX}_{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {hist[-2]:.6f}")
+                lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /metrics and /traces/<session_id> from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path.startswith("/traces/"):
+                    trace = registry.get_trace(self.path[len("/traces/"):])
+                    body, ctype = json.dumps(trace).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Metrics served on http://{host}:{port}/metrics")
+        return server
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+# Shared by the executor, the uploader and the app
+metrics = Metrics()
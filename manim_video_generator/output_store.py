@@ -0,0 +1,146 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+SAFE_NAME_RE = re.compile(r"[^\w.-]")
+CHUNK_SIZE = 256 * 1024
+
+
+class OutputStore:
+    """Rendered videos under unique names in per-session folders, bounded by size and age
+
+    Videos are moved (renamed) into the store when they are on the same filesystem
+    and hard-linked out of the render cache, so a finished render is never copied.
+    """
+
+    def __init__(self, root: str = "output", max_bytes: int = 5 * 1024 ** 3, max_age: Optional[float] = 7 * 24 * 3600):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def _target(self, session_id: Optional[str]) -> Path:
+        folder = self.root / (SAFE_NAME_RE.sub("_", session_id) if session_id else "shared")
+        folder.mkdir(parents=True, exist_ok=True)
+        return folder / f"video_{uuid.uuid4().hex}.mp4"
+
+    def store(self, video_file: Path, session_id: Optional[str] = None, move: bool = False) -> Path:
+        """Put the video into the store, taking it over when `move` is set"""
+        target = self._target(session_id)
+        if move:
+            # A rename on the same filesystem, a copy and delete across filesystems
+            shutil.move(str(video_file), target)
+        else:
+            try:
+                os.link(video_file, target)
+            except OSError:
+                shutil.copy2(video_file, target)
+        os.utime(target)
+        logger.info(f"Video stored: {target}")
+        self._evict(keep=target)
+        return target
+
+    def touch(self, path: Path):
+        """Mark the video as recently used"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: Optional[Path] = None):
+        with self._lock:
+            entries = []
+            for f in self.root.rglob("*.mp4"):
+                try:
+                    entries.append((f, f.stat()))
+                except FileNotFoundError:
+                    continue
+            entries.sort(key=lambda e: e[1].st_mtime)
+            total = sum(st.st_size for _, st in entries)
+            now = time.time()
+            for f, st in entries:
+                expired = self.max_age is not None and now - st.st_mtime > self.max_age
+                if f == keep or not (expired or total > self.max_bytes):
+                    continue
+                f.unlink(missing_ok=True)
+                total -= st.st_size
+                logger.info(f"Output evicted: {f}")
+                if f.parent != self.root and not any(f.parent.iterdir()):
+                    f.parent.rmdir()
+
+    def resolve(self, relative: str) -> Optional[Path]:
+        """Path of a stored video from its URL path, None if it is not in the store"""
+        path = (self.root / relative.lstrip("/")).resolve()
+        root = self.root.resolve()
+        if root not in path.parents or path.suffix != ".mp4" or not path.is_file():
+            return None
+        return path
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve /videos/<session>/<name>.mp4 with HTTP range support from a daemon thread"""
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self._send(head=True)
+
+            def do_GET(self):
+                self._send(head=False)
+
+            def _send(self, head: bool):
+                path = store.resolve(self.path[len("/videos/"):]) if self.path.startswith("/videos/") else None
+                if path is None:
+                    self.send_error(404)
+                    return
+                size = path.stat().st_size
+                start, end = 0, size - 1
+                match = RANGE_RE.match(self.headers.get("Range", "").strip())
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    else:
+                        start = max(0, size - int(match.group(2)))  # suffix range: the last N bytes
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                store.touch(path)
+                if head:
+                    return
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        chunk = f.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        remaining -= len(chunk)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="output-http", daemon=True).start()
+        logger.info(f"Videos served on http://{host}:{port}/videos/")
+        return server
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import tokenize
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+
+class RenderCache:
+    """Content-addressed on-disk cache of rendered videos with size-bounded LRU eviction"""
+
+    def __init__(self, cache_dir: str = "cache/renders", max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        logger.info(f"Render cache initialized: {self.cache_dir} (max {max_bytes // 1024 ** 2} MB)")
+
+    @staticmethod
+    def normalize_code(code: str) -> str:
+        """The code's tokens without comments and blank lines, so cosmetic edits hit the cache
+
+        String literals are kept as they are, a blank line inside one changes the video.
+        """
+        try:
+            tokens = [
+                "\n" if tok.type == tokenize.NEWLINE else tok.string
+                for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+                if tok.type not in (tokenize.COMMENT, tokenize.NL)
+            ]
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            # Broken code is still a valid key, it just isn't normalized
+            return code
+        return json.dumps(tokens, ensure_ascii=False)
+
+    def key(self, code: str, scene_name: str, quality: str, music: dict) -> str:
+        """Hash everything that affects the produced video"""
+        payload = json.dumps(
+            {"code": self.normalize_code(code), "scene": scene_name, "quality": quality, "music": music},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.mp4"
+
+    def get(self, key: str) -> Optional[Path]:
+        """Return the cached video for the key, or None"""
+        path = self._path(key)
+        with self._lock:
+            if not path.exists():
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Touch the entry so that eviction is least-recently-used
+            os.utime(path)
+        logger.info(f"Render cache hit: {key[:12]}")
+        return path
+
+    def put(self, key: str, video_file: Path) -> Path:
+        """Store a rendered video under the key"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            # Share the file with the output store instead of copying it
+            os.link(video_file, tmp_path)
+        except OSError:
+            shutil.copy2(video_file, tmp_path)
+        os.replace(tmp_path, path)
+        os.utime(path)
+        logger.info(f"Render cached: {key[:12]}")
+        self._evict()
+        return path
+
+    def _entries(self) -> list:
+        """Cached videos with their stat, least recently used first"""
+        entries = []
+        # Other app workers sharing the directory may evict the same files meanwhile
+        for f in self.cache_dir.glob("*.mp4"):
+            try:
+                entries.append((f, f.stat()))
+            except FileNotFoundError:
+                continue
+        return sorted(entries, key=lambda e: e[1].st_mtime)
+
+    def _evict(self):
+        with self._lock:
+            entries = self._entries()
+            total = sum(st.st_size for _, st in entries)
+            for f, st in entries:
+                if total <= self.max_bytes:
+                    break
+                f.unlink(missing_ok=True)
+                total -= st.st_size
+                logger.info(f"Render cache evicted: {f.name}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._entries()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(st.st_size for _, st in entries),
+            }
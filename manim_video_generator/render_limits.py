@@ -0,0 +1,100 @@
+import os
+import resource
+import signal
+from dataclasses import dataclass
+from typing import Optional
+
+from loguru import logger
+
+from .cost_estimator import QUALITY_FPS, estimate_duration
+
+# numpy's BLAS starts a thread per core on import, which fails under RLIMIT_AS on many-core
+# hosts; renders run side by side in the pool, so one thread each is enough
+THREAD_ENV_VARS = ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+class RenderLimitError(RuntimeError):
+    """A render was stopped because it exceeded one of the RenderLimits"""
+
+    def __init__(self, kind: str, limit, detail: str = ""):
+        self.kind = kind  # timeout | memory | cpu_time | output_size | frames
+        self.limit = limit
+        self.detail = detail
+        super().__init__(f"Render exceeded the {kind.replace('_', ' ')} limit ({limit}){': ' + detail if detail else ''}")
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "limit": self.limit, "detail": self.detail}
+
+
+@dataclass
+class RenderLimits:
+    """Per-render resource limits, None disables a limit"""
+
+    timeout: float = 300  # wall clock seconds
+    address_space_mb: Optional[int] = 4096
+    cpu_seconds: Optional[int] = 600
+    max_output_mb: Optional[int] = 1024  # largest single file a render may write
+    niceness: int = 10
+    max_frames: Optional[int] = 120 * 60  # two minutes at 60 fps
+    blas_threads: Optional[int] = 1  # threads of numpy's BLAS/OpenMP in a render, unless set in the env
+
+    def env(self) -> dict:
+        """Environment for a render process"""
+        env = dict(os.environ)
+        if self.blas_threads:
+            for name in THREAD_ENV_VARS:
+                env.setdefault(name, str(self.blas_threads))
+        return env
+
+    def apply(self, pid: int = 0, cpu_used: float = 0):
+        """Set the limits on a started process (0 means the calling process)
+
+        ``cpu_used`` is added to the CPU limit for processes that render more than once.
+        """
+        limits = {
+            resource.RLIMIT_AS: self.address_space_mb and self.address_space_mb * 1024 ** 2,
+            resource.RLIMIT_CPU: self.cpu_seconds and int(cpu_used + self.cpu_seconds),
+            resource.RLIMIT_FSIZE: self.max_output_mb and self.max_output_mb * 1024 ** 2,
+        }
+        for kind, soft in limits.items():
+            if not soft:
+                continue
+            try:
+                _, hard = resource.prlimit(pid, kind)
+                if hard != resource.RLIM_INFINITY:
+                    soft = min(soft, hard)
+                resource.prlimit(pid, kind, (soft, hard))
+            except (OSError, ValueError) as e:
+                # The process may already be gone or limits may not be permitted in this container
+                logger.warning(f"Could not set render limit {kind}: {e}")
+        if self.niceness:
+            try:
+                os.setpriority(os.PRIO_PROCESS, pid, self.niceness)
+            except OSError as e:
+                logger.warning(f"Could not lower render priority: {e}")
+
+    def classify_exit(self, returncode: Optional[int], output: str = "") -> Optional[RenderLimitError]:
+        """Explain a failed render with the limit that killed it, if any"""
+        if returncode == -signal.SIGXCPU or "CPU time limit exceeded" in output:
+            return RenderLimitError("cpu_time", f"{self.cpu_seconds} s")
+        if returncode == -signal.SIGXFSZ or "File too large" in output:
+            return RenderLimitError("output_size", f"{self.max_output_mb} MB")
+        if "MemoryError" in output or "Cannot allocate memory" in output:
+            return RenderLimitError("memory", f"{self.address_space_mb} MB")
+        return None
+
+    def check_frames(self, code: str, scene_name: str, quality: str):
+        """Reject scenes whose statically estimated length is over the frame cap"""
+        if not self.max_frames:
+            return
+        seconds = estimate_duration(code, scene_name)
+        if seconds is None:
+            return
+        frames = int(seconds * QUALITY_FPS.get(quality, 60))
+        if frames > self.max_frames:
+            raise RenderLimitError(
+                "frames",
+                f"{self.max_frames} frames",
+                f"the scene plays for at least {seconds:.0f} s ({frames} frames)",
+            )
+
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from loguru import logger
+
+
+class RenderCancelled(RuntimeError):
+    """Raised when a render job was cancelled before or while rendering"""
+
+
+class RenderJob:
+    """A single queued render request"""
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        code: str,
+        scene_name: str = "VideoScene",
+        session_id: Optional[str] = None,
+        quality: Optional[str] = None,
+        workspace_id: Optional[str] = None,
+    ):
+        self.id = next(self._ids)
+        self.code = code
+        self.scene_name = scene_name
+        self.session_id = session_id
+        self.quality = quality  # None means the executor's default quality
+        # Jobs of one session rendering side by side need workspaces of their own
+        self.workspace_id = workspace_id or session_id
+        self.future: Optional[Future] = None
+        self.report: dict = {}  # details filled in by the renderer, e.g. reused segments
+        self.progress = None  # RenderProgress updated while manim is running
+        self._cancel_event = threading.Event()
+        self._processes: List[Union[subprocess.Popen, multiprocessing.Process]] = []
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"RenderJob(id={self.id}, session_id={self.session_id!r})"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def attach_process(self, process: Union[subprocess.Popen, multiprocessing.Process]):
+        """Register a running (sub)process so that cancellation can kill it"""
+        with self._lock:
+            self._processes.append(process)
+        if self.cancelled:
+            self._kill_processes()
+
+    def detach_process(self, process: Union[subprocess.Popen, multiprocessing.Process]):
+        """Forget the process once it no longer works for this job (e.g. a reused warm worker)"""
+        with self._lock:
+            if process in self._processes:
+                self._processes.remove(process)
+
+    def check_cancelled(self):
+        """Raise RenderCancelled if the job has been cancelled"""
+        if self.cancelled:
+            raise RenderCancelled(f"Render job {self.id} was cancelled")
+
+    def cancel(self):
+        """Cancel the job: drop it from the queue or kill its running process"""
+        if self.done():
+            return
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+        self._kill_processes()
+        logger.info(f"Render job {self.id} cancelled")
+
+    def _kill_processes(self):
+        with self._lock:
+            processes = list(self._processes)
+        # Both Popen and multiprocessing.Process ignore kill() once the process has exited
+        for process in processes:
+            process.kill()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self) -> Path:
+        """Return the rendered video path of a finished job"""
+        if self.cancelled or (self.future is not None and self.future.cancelled()):
+            raise RenderCancelled(f"Render job {self.id} was cancelled")
+        return self.future.result()
+
+    async def wait(self) -> Path:
+        """Wait for the job without blocking the event loop"""
+        wrapped = asyncio.wrap_future(self.future)
+        # The outcome is read from the job below, retrieve it here so a failed render
+        # isn't reported as "Future exception was never retrieved"
+        wrapped.add_done_callback(lambda f: f.cancelled() or f.exception())
+        # asyncio.wait does not propagate cancellation of the awaiting task to the job
+        await asyncio.wait([wrapped])
+        return self.result()
+
+
+class RenderPool:
+    """Bounded FIFO pool of render workers
+
+    Renders are heavy subprocesses, so threads are enough to keep all cores busy
+    while the event loop stays free.
+    """
+
+    def __init__(self, render_fn: Callable[[RenderJob], Path], max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._render_fn = render_fn
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="render")
+        self._pending: deque[RenderJob] = deque()
+        self._running: set[RenderJob] = set()
+        self._lock = threading.Lock()
+        logger.info(f"Render pool started with {self.max_workers} workers")
+
+    def submit(self, job: RenderJob) -> RenderJob:
+        """Put the job at the end of the queue"""
+        with self._lock:
+            self._pending.append(job)
+        job.future = self._executor.submit(self._run, job)
+        job.future.add_done_callback(lambda _: self._discard(job))
+        logger.info(f"Render job {job.id} queued at position {self.position(job)}")
+        return job
+
+    def _run(self, job: RenderJob) -> Path:
+        with self._lock:
+            if job in self._pending:
+                self._pending.remove(job)
+            self._running.add(job)
+        try:
+            job.check_cancelled()
+            return self._render_fn(job)
+        except Exception:
+            # A killed process surfaces as a render error, report it as a cancellation
+            job.check_cancelled()
+            raise
+
+    def _discard(self, job: RenderJob):
+        with self._lock:
+            if job in self._pending:
+                self._pending.remove(job)
+            self._running.discard(job)
+
+    def position(self, job: RenderJob) -> Optional[int]:
+        """1-based queue position, 0 while rendering, None once finished"""
+        with self._lock:
+            if job in self._running:
+                return 0
+            if job in self._pending:
+                return self._pending.index(job) + 1
+        return None
+
+    def cancel_session(self, session_id: str, exclude: Optional[RenderJob] = None):
+        """Cancel every queued or running job of the session, except `exclude`"""
+        with self._lock:
+            jobs = [
+                j for j in (*self._pending, *self._running)
+                if j.session_id == session_id and j is not exclude
+            ]
+        for job in jobs:
+            job.cancel()
+
+    @property
+    def queued(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def shutdown(self):
+        with self._lock:
+            jobs = [*self._pending, *self._running]
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=False)
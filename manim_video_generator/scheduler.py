@@ -0,0 +1,104 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from loguru import logger
+
+from .cost_estimator import QUALITY_FPS, QUALITY_RESOLUTION, CostEstimator, SceneEstimate
+from .render_pool import RenderPool
+
+# Manim's quality presets, cheapest first
+QUALITY_LADDER = ("l", "m", "h", "p", "k")
+# Scene length assumed when the code can't be analysed
+DEFAULT_SECONDS = 15.0
+
+
+@dataclass
+class RenderPlan:
+    quality: str
+    fps: int
+    resolution: Tuple[int, int]
+    cost: float  # megapixel-frames at the chosen quality
+    render_seconds: float  # predicted wall time of the render
+    degraded: bool  # below the target quality because of load or cost
+    reason: str = ""
+
+
+class RenderScheduler:
+    """Picks the render quality of a job from the pool load and the scene's cost
+
+    The target quality is lowered one step when every worker is busy and two steps
+    when the queue is twice the pool size, and raised one step when the pool is
+    mostly idle and the scene is cheap. Scenes whose frames would exceed `max_cost`
+    at a quality are stepped down regardless of load.
+    """
+
+    def __init__(
+        self,
+        pool: RenderPool,
+        target_quality: str = "m",
+        min_quality: str = "l",
+        max_quality: str = "h",
+        max_cost: float = 1500,
+        idle_load: float = 0.5,
+        estimator: Optional[CostEstimator] = None,
+        backend: str = "cli",
+    ):
+        self.pool = pool
+        self.estimator = estimator or CostEstimator(timings_file=None)
+        self.backend = backend
+        self.target_quality = target_quality
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.max_cost = max_cost
+        self.idle_load = idle_load
+
+    def load(self) -> float:
+        """Jobs in the pool per worker, over 1 means jobs are waiting"""
+        return (self.pool.queued + self.pool.running) / self.pool.max_workers
+
+    def plan(self, code: str, scene_name: str = "VideoScene", target: Optional[str] = None) -> RenderPlan:
+        target = target or self.target_quality
+        lowest, highest = QUALITY_LADDER.index(self.min_quality), QUALITY_LADDER.index(self.max_quality)
+        step = QUALITY_LADDER.index(target)
+        estimate = self.estimator.estimate(code, scene_name)
+        if estimate.seconds is None:
+            estimate = SceneEstimate(DEFAULT_SECONDS)
+        seconds = estimate.seconds
+        load = self.load()
+
+        reason = ""
+        if load >= 2:
+            step, reason = step - 2, f"load {load:.1f}"
+        elif load >= 1:
+            step, reason = step - 1, f"load {load:.1f}"
+        elif load < self.idle_load and step < highest:
+            if estimate.megapixel_frames(QUALITY_LADDER[step + 1]) <= self.max_cost:
+                step, reason = step + 1, "idle"
+        step = max(lowest, min(highest, step))
+        while step > lowest and estimate.megapixel_frames(QUALITY_LADDER[step]) > self.max_cost:
+            step, reason = step - 1, f"cost of a {seconds:.0f} s scene"
+
+        quality = QUALITY_LADDER[step]
+        plan = RenderPlan(
+            quality=quality,
+            fps=QUALITY_FPS[quality],
+            resolution=QUALITY_RESOLUTION[quality],
+            cost=round(estimate.megapixel_frames(quality), 1),
+            render_seconds=round(self.estimator.render_seconds(estimate, quality, self.backend), 1),
+            degraded=step < QUALITY_LADDER.index(target),
+            reason=reason,
+        )
+        if quality != target:
+            logger.info(f"Scheduled {quality} instead of {target} ({reason})")
+        return plan
+
+    async def wait_for_idle(self, poll_interval: float = 2.0, timeout: Optional[float] = None) -> bool:
+        """Wait until the pool load drops below idle_load, False on timeout"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while self.load() >= self.idle_load:
+            if deadline is not None and loop.time() > deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+        return True
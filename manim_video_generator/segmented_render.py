@@ -0,0 +1,86 @@
+import ast
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Calls on `self` inside construct() that never play an animation
+NON_PLAYING_METHODS = {
+    "add", "remove", "clear", "bring_to_front", "bring_to_back", "add_foreground_mobject",
+    "add_foreground_mobjects", "remove_foreground_mobject", "remove_foreground_mobjects",
+    "add_updater", "remove_updater", "set_camera_orientation", "add_fixed_in_frame_mobjects",
+    "add_fixed_orientation_mobjects", "add_sound",
+}
+
+# Every call of these advances Manim's animation counter by one
+PLAYING_METHODS = {"play", "wait", "pause", "wait_until"}
+
+
+def count_animations(code: str, scene_name: str = "VideoScene") -> Optional[int]:
+    """Number of animations played by construct(), or None if it can't be known statically
+
+    Only straight-line scenes are counted: a play/wait inside a loop, a branch or
+    a helper method makes the count depend on runtime values.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    scene = next((n for n in tree.body if isinstance(n, ast.ClassDef) and n.name == scene_name), None)
+    if scene is None:
+        return None
+    construct = next((n for n in scene.body if isinstance(n, ast.FunctionDef) and n.name == "construct"), None)
+    if construct is None:
+        return None
+
+    count = 0
+    for stmt in construct.body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Call) and any(_is_self(arg) for arg in node.args):
+                # The scene is handed to a helper that may play animations
+                return None
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _is_self(node.func.value)):
+                continue
+            method = node.func.attr
+            if method in PLAYING_METHODS:
+                if not (isinstance(stmt, ast.Expr) and stmt.value is node):
+                    return None
+                count += 1
+            elif method not in NON_PLAYING_METHODS:
+                return None
+    return count
+
+
+def segment_ranges(animations: Optional[int], parts: int, min_size: int = 2) -> List[Tuple[int, int]]:
+    """Split animations 0..N-1 into contiguous inclusive ranges for `manim -n start,end`"""
+    if not animations:
+        return []
+    # Manim treats an end of 0 as "until the end", so every range has at least two animations
+    parts = max(1, min(parts, animations // max(min_size, 2)))
+    size, extra = divmod(animations, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def concat_videos(video_files: List[Path], output_file: Path) -> Path:
+    """Join segments rendered with identical settings without re-encoding"""
+    list_file = output_file.with_suffix(".txt")
+    list_file.write_text("".join(f"file '{f.resolve()}'\n" for f in video_files), encoding="utf-8")
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-v", "error",
+            "-f", "concat", "-safe", "0", "-i", str(list_file),
+            "-c", "copy", "-movflags", "+faststart",
+            str(output_file),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return output_file
+
+
+def _is_self(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "self"
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from loguru import logger
+
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Part fields worth keeping, thoughts and everything else are dropped
+KEPT_PART_FIELDS = ("text", "file_data")
+
+
+def compact_history(contents, max_messages: int = 40, file_expiry: Optional[dict] = None) -> List[dict]:
+    """Chat history as plain content dicts without thoughts, the latest turns only
+
+    Uploaded files listed in `file_expiry` (uri -> ISO expiration time) are dropped
+    once Gemini has deleted them, the chat would be rejected with them.
+    """
+    now = datetime.now(timezone.utc)
+    expired = {uri for uri, expires in (file_expiry or {}).items() if datetime.fromisoformat(expires) <= now}
+    messages = []
+    for content in contents:
+        data = content.model_dump(mode="json", exclude_none=True) if hasattr(content, "model_dump") else content
+        parts = [
+            {k: part[k] for k in KEPT_PART_FIELDS if k in part}
+            for part in data.get("parts") or []
+            if not part.get("thought") and part.get("file_data", {}).get("file_uri") not in expired
+        ]
+        parts = [part for part in parts if part]
+        if parts:
+            messages.append({"role": data.get("role", "user"), "parts": parts})
+    messages = messages[-max_messages:]
+    # The history has to start with a user turn
+    while messages and messages[0]["role"] != "user":
+        messages.pop(0)
+    return messages
+
+
+class SessionStore:
+    """Bounded set of live sessions with snapshots on disk
+
+    Sessions are checked out while a handler runs and checked in with a JSON
+    snapshot afterwards. Idle sessions, and the least recently used ones when there
+    are too many or their snapshots add up to more than `max_bytes`, are released:
+    they drop their live chat and are revived from the snapshot on next use. The
+    snapshots also let another worker process resume a session by its id.
+
+    Sessions need `session_id` and a `release()` method.
+    """
+
+    def __init__(
+        self,
+        root: str = "cache/session_state",
+        idle_ttl: float = 1800,
+        max_live: int = 500,
+        max_bytes: int = 64 * 1024 ** 2,
+        max_age: float = 7 * 24 * 3600,
+        cleanup_interval: float = 600,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.idle_ttl = idle_ttl
+        self.max_live = max_live
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.cleanup_interval = cleanup_interval
+        # session_id -> [weak reference, last use, snapshot size, running handlers], least recently used first
+        self._live: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        logger.info(f"Session store initialized: {self.root} (idle ttl {idle_ttl}s, max {max_live} live)")
+
+    def _path(self, session_id: str) -> Optional[Path]:
+        if not SESSION_ID_RE.match(session_id or ""):
+            return None
+        return self.root / f"{session_id}.json"
+
+    def checkout(self, session):
+        """The session is in use by a handler and must not be released"""
+        with self._lock:
+            entry = self._live.pop(session.session_id, None) or [weakref.ref(session), 0.0, 0, 0]
+            entry[1], entry[3] = time.time(), entry[3] + 1
+            self._live[session.session_id] = entry
+
+    def checkin(self, session, snapshot: dict):
+        """The handler is done, persist the session and enforce the limits"""
+        size = self.save(snapshot)
+        with self._lock:
+            entry = self._live.get(session.session_id)
+            if entry is not None:
+                entry[1], entry[2], entry[3] = time.time(), size, max(0, entry[3] - 1)
+        self.evict()
+        if time.time() - self._last_cleanup > self.cleanup_interval:
+            self.cleanup()
+
+    def save(self, snapshot: dict) -> int:
+        path = self._path(snapshot["session_id"])
+        data = json.dumps(snapshot, ensure_ascii=False)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(data, encoding="utf-8")
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def load(self, session_id: str) -> Optional[dict]:
+        """Snapshot of a session saved by this or another worker"""
+        path = self._path(session_id)
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def evict(self):
+        """Release idle sessions and the least recently used ones over the limits"""
+        now = time.time()
+        released = []
+        with self._lock:
+            total = sum(entry[2] for entry in self._live.values())
+            for session_id, (ref, last_use, size, running) in list(self._live.items()):
+                session = ref()
+                if session is None:
+                    # Gradio dropped the session state
+                    del self._live[session_id]
+                    total -= size
+                    continue
+                over_limits = len(self._live) > self.max_live or total > self.max_bytes
+                if running or not (over_limits or now - last_use > self.idle_ttl):
+                    continue
+                del self._live[session_id]
+                total -= size
+                released.append(session)
+        for session in released:
+            session.release()
+            logger.info(f"Released idle session {session.session_id}")
+
+    def cleanup(self):
+        """Remove snapshots of sessions that were not used for longer than max_age"""
+        self._last_cleanup = time.time()
+        deadline = self._last_cleanup - self.max_age
+        for path in self.root.glob("*.json"):
+            if path.stat().st_mtime < deadline and path.stem not in self._live:
+                path.unlink(missing_ok=True)
+                logger.info(f"Removed expired session snapshot: {path.name}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "live": len(self._live),
+                "bytes": sum(entry[2] for entry in self._live.values()),
+                "running": sum(1 for entry in self._live.values() if entry[3]),
+            }
@@ -0,0 +1,63 @@
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+
+
+class SessionWorkspaces:
+    """Persistent per-session working directories
+
+    Manim hashes every animation and keeps the encoded segment in
+    ``media/.../partial_movie_files``. Rendering a session's iterations in the
+    same directory lets it skip the animations that did not change.
+    """
+
+    def __init__(self, root: str = "cache/sessions", ttl: float = 3600, cleanup_interval: float = 60):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._last_cleanup = 0.0
+        logger.info(f"Session workspaces initialized: {self.root} (ttl {ttl}s)")
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(session_id, threading.Lock())
+
+    @contextmanager
+    def acquire(self, session_id: str) -> Iterator[Path]:
+        """Exclusive access to the session directory for one render"""
+        if time.time() - self._last_cleanup > self.cleanup_interval:
+            self.cleanup()
+        path = self.root / session_id
+        with self._lock_for(session_id):
+            path.mkdir(parents=True, exist_ok=True)
+            try:
+                yield path
+            finally:
+                # mtime of the directory marks the last use for TTL cleanup
+                path.touch()
+
+    def cleanup(self):
+        """Remove session directories that were not used for longer than the TTL"""
+        self._last_cleanup = time.time()
+        deadline = self._last_cleanup - self.ttl
+        for path in self.root.iterdir():
+            if not path.is_dir() or path.stat().st_mtime > deadline:
+                continue
+            lock = self._lock_for(path.name)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Removed expired session workspace: {path}")
+            finally:
+                lock.release()
+                with self._locks_guard:
+                    self._locks.pop(path.name, None)
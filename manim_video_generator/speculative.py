@@ -0,0 +1,33 @@
+import asyncio
+from typing import List
+
+from loguru import logger
+
+from .render_pool import RenderJob
+
+
+async def first_success(jobs: List[RenderJob]) -> int:
+    """Wait for the first job that renders successfully and cancel the others
+
+    Returns the index of the winning job. If every job fails, the error of the
+    first one (the primary candidate) is raised.
+    """
+    waiters = {asyncio.ensure_future(job.wait()): i for i, job in enumerate(jobs)}
+    errors = {}
+    try:
+        while waiters:
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in sorted(done, key=waiters.get):
+                i = waiters.pop(waiter)
+                if waiter.exception() is None:
+                    logger.info(f"Candidate {i} rendered first, cancelling {len(jobs) - 1} others")
+                    for j, job in enumerate(jobs):
+                        if j != i:
+                            job.cancel()
+                    return i
+                errors[i] = waiter.exception()
+                logger.info(f"Candidate {i} failed: {errors[i]}")
+        raise errors[min(errors)]
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
@@ -1,28 +1,127 @@
 import os
+import re
+import hashlib
+import threading
+import time
+import codecs
+import selectors
 import tempfile
 import subprocess
 import shutil
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional
 from loguru import logger
-from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, concatenate_audioclips
+
+from .render_pool import RenderJob, RenderPool
+from .render_cache import RenderCache
+from .session_workspace import SessionWorkspaces
+from .warm_renderer import WarmRenderPool
+from .segmented_render import concat_videos, count_animations, segment_ranges
+from .render_limits import RenderLimitError, RenderLimits
+from .manim_progress import ProgressParser
+from .metrics import metrics
+from .output_store import OutputStore
+from .cost_estimator import CostEstimator
+
+
+# Output still collected after the exception line of a traceback before manim is killed
+TRACEBACK_GRACE_PERIOD = 0.5
 
 
 class VideoExecutor:
-    def __init__(self, output_dir: str = "output"):
+    def __init__(
+        self,
+        output_dir: str = "output",
+        max_workers: Optional[int] = None,
+        cache_dir: Optional[str] = "cache/renders",
+        cache_max_bytes: int = 2 * 1024 ** 3,
+        workspace_dir: Optional[str] = "cache/sessions",
+        workspace_ttl: float = 3600,
+        render_backend: str = "cli",
+        segment_workers: int = 1,
+        limits: Optional[RenderLimits] = None,
+        output_max_bytes: int = 5 * 1024 ** 3,
+        output_max_age: Optional[float] = 7 * 24 * 3600,
+        timings_file: Optional[str] = "cache/render_timings.jsonl",
+    ):
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
+        self.outputs = OutputStore(output_dir, output_max_bytes, output_max_age)
         self.music_file = Path("data/music.mp3")
+        self.music_volume = 0.3  # 30% volume
+        self.mux_mode = "ffmpeg"  # 'ffmpeg' copies the video stream, 'moviepy' re-encodes everything
+        self.music_cache_dir = Path("cache/music")
+        self._music_lock = threading.Lock()
+        self.quality = "m"  # 'l'=low, 'm'=medium, 'h'=high, 'p'=4k, 'k'=8k
+        self.pool = RenderPool(self._render_job, max_workers)
+        self.cache = RenderCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.workspaces = SessionWorkspaces(workspace_dir, workspace_ttl) if workspace_dir else None
+        # 'cli' spawns `manim render` per video, 'warm' reuses pre-imported worker processes
+        self.warm_pool = WarmRenderPool(self.pool.max_workers) if render_backend == "warm" else None
+        # >1 renders straight-line scenes as parallel animation ranges (CLI backend only)
+        self.segment_workers = segment_workers
+        self.limits = limits or RenderLimits()
+        # Predicts render times, calibrated with the timings of finished renders
+        self.estimator = CostEstimator(timings_file)
         logger.info(f"VideoExecutor initialized, output directory: {self.output_dir}")
         
         if not self.music_file.exists():
             logger.warning(f"Background music file not found: {self.music_file}")
 
-    def execute_manim_code(self, code: str, scene_name: str = "VideoScene") -> Path:
+    def submit(
+        self,
+        code: str,
+        scene_name: str = "VideoScene",
+        session_id: Optional[str] = None,
+        quality: Optional[str] = None,
+        workspace_id: Optional[str] = None,
+    ) -> RenderJob:
+        """Queue Manim code for rendering in the worker pool"""
+        return self.pool.submit(RenderJob(code, scene_name, session_id, quality, workspace_id))
+
+    async def render_async(
+        self,
+        code: str,
+        scene_name: str = "VideoScene",
+        session_id: Optional[str] = None,
+        quality: Optional[str] = None,
+    ) -> Path:
+        """Render in the worker pool without blocking the event loop"""
+        job = self.submit(code, scene_name, session_id, quality)
+        try:
+            return await job.wait()
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+
+    def _render_job(self, job: RenderJob) -> Path:
+        return self.execute_manim_code(job.code, job.scene_name, job=job, quality=job.quality)
+
+    def execute_manim_code(
+        self,
+        code: str,
+        scene_name: str = "VideoScene",
+        job: Optional[RenderJob] = None,
+        quality: Optional[str] = None,
+    ) -> Path:
         """Execute Manim code in an isolated environment and return the video path"""
         
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = Path(temp_dir)
-            
+        quality = quality or self.quality
+        session_id = job.session_id if job is not None else None
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(code, scene_name, quality, self._music_settings())
+            cached = self.cache.get(cache_key)
+            metrics.inc("render_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                with metrics.span("store", session_id):
+                    return self.outputs.store(cached, session_id)
+        
+        self.limits.check_frames(code, scene_name, quality)
+        
+        with self._workdir(job) as temp_path:
             # Create a temporary file with the code
             code_file = temp_path / "scene.py"
             with open(code_file, "w", encoding="utf-8") as f:
@@ -31,52 +130,190 @@ class VideoExecutor:
             logger.info(f"Code written to temporary file: {code_file}")
             
             # Run Manim
-            output_file = self._run_manim(code_file, scene_name, temp_path)
+            backend = self._backend(code, scene_name)
+            estimate = self.estimator.estimate(code, scene_name)
+            started = time.monotonic()
+            with metrics.span("render", session_id, quality=quality, backend=backend):
+                output_file = self._run_manim(code_file, scene_name, temp_path, job, quality)
+            if not (job is not None and job.report.get("reused_segments")):
+                # Renders that reused cached animations would skew the calibration
+                self.estimator.record(estimate, quality, backend, time.monotonic() - started)
             
             # Add background music
-            output_file = self._add_background_music(output_file, temp_path)
+            if job is not None:
+                job.check_cancelled()
+            with metrics.span("mux", session_id, mode=self.mux_mode):
+                output_file = self._add_background_music(output_file, temp_path)
             
-            # Copy the result to the output folder
-            final_output = self._copy_to_output(output_file)
+            # Move the result out of the work dir into the output store
+            with metrics.span("store", session_id):
+                final_output = self.outputs.store(output_file, session_id, move=True)
+            
+            if cache_key is not None:
+                try:
+                    self.cache.put(cache_key, final_output)
+                except OSError as e:
+                    # The render succeeded, a cache write must not fail it
+                    logger.warning(f"Could not cache render {cache_key[:12]}: {e}")
             
             return final_output
 
-    def _run_manim(self, code_file: Path, scene_name: str, temp_dir: Path) -> Path:
+    @contextmanager
+    def _workdir(self, job: Optional[RenderJob] = None):
+        """Session workspace (keeps Manim's partial movie cache) or a throwaway temp dir"""
+        if self.workspaces is not None and job is not None and job.workspace_id:
+            with self.workspaces.acquire(job.workspace_id) as path:
+                yield path
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                yield Path(temp_dir)
+
+    def _backend(self, code: str, scene_name: str) -> str:
+        """Renderer _run_manim picks for the code, render times are calibrated per backend"""
+        if self.warm_pool is not None:
+            return "warm"
+        if self.segment_workers > 1 and len(segment_ranges(count_animations(code, scene_name), self.segment_workers)) > 1:
+            return "segmented"
+        return "cli"
+
+    def _run_manim(
+        self,
+        code_file: Path,
+        scene_name: str,
+        temp_dir: Path,
+        job: Optional[RenderJob] = None,
+        quality: Optional[str] = None,
+    ) -> Path:
         """Run Manim to render the video"""
         
-        cmd = [
-            "manim", "render",
-            str(code_file),
-            scene_name,
-            "--format", "mp4",
-            "-q", "m",  # medium quality: 'l'=low, 'm'=medium, 'h'=high, 'p'=4k, 'k'=8k
-            "--output_file", "video.mp4"
-        ]
+        self._clear_videos(temp_dir)
+        if self.warm_pool is not None:
+            return self._run_manim_warm(code_file, scene_name, temp_dir, job, quality)
+        
+        animations = count_animations(code_file.read_text(encoding="utf-8"), scene_name)
+        if self.segment_workers > 1:
+            ranges = segment_ranges(animations, self.segment_workers)
+            if len(ranges) > 1:
+                return self._run_manim_segmented(code_file, scene_name, temp_dir, ranges, job, quality)
+        
+        cmd = self._manim_cmd(code_file, scene_name, quality)
         
         logger.info(f"Executing command: {' '.join(cmd)}")
         
         # Execute the command in the temporary directory
-        result = subprocess.run(
+        process = self._spawn_manim(cmd, temp_dir, job, merge_output=True)
+        parser = ProgressParser(animations)
+        output = self._stream_manim(process, parser, job)
+        
+        if job is not None:
+            job.check_cancelled()
+        if process.returncode != 0:
+            logger.error(f"Manim execution error: {output}")
+            self._raise_limit_error(process.returncode, output)
+            raise RuntimeError(f"Manim exited with error: {output}")
+        
+        logger.info("Manim executed successfully")
+        
+        reused, total = self._segment_reuse(output)
+        logger.info(f"Reused {reused} of {total} cached animation segments")
+        if job is not None:
+            job.report.update(reused_segments=reused, total_segments=total)
+        
+        return self._find_video(temp_dir / "media")
+
+    def _spawn_manim(
+        self,
+        cmd: list,
+        temp_dir: Path,
+        job: Optional[RenderJob] = None,
+        merge_output: bool = False,
+    ) -> subprocess.Popen:
+        """Start a manim process with the render limits applied"""
+        process = subprocess.Popen(
             cmd,
             cwd=temp_dir,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minutes max
+            env=self.limits.env(),
+            stdout=subprocess.PIPE,
+            # Merged output is read as raw bytes by _stream_manim
+            stderr=subprocess.STDOUT if merge_output else subprocess.PIPE,
+            text=not merge_output,
+            start_new_session=True  # keep terminal signals of the app away from renders
         )
+        # prlimit() right after the start avoids preexec_fn, which is unsafe with the render threads
+        self.limits.apply(process.pid)
+        if job is not None:
+            job.attach_process(process)
+        return process
+
+    def _stream_manim(self, process: subprocess.Popen, parser: ProgressParser, job: Optional[RenderJob] = None) -> str:
+        """Read manim output as it arrives, publish progress and stop at the first traceback"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        deadline = time.monotonic() + self.limits.timeout
+        abort_at = None
+        fd = process.stdout.fileno()
+        if job is not None:
+            job.progress = parser.progress
         
-        if result.returncode != 0:
-            logger.error(f"Manim execution error: {result.stderr}")
-            raise RuntimeError(f"Manim exited with error: {result.stderr}")
-        
-        logger.info("Manim executed successfully")
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    process.kill()
+                    process.wait()
+                    raise RenderLimitError("timeout", f"{self.limits.timeout} s")
+                if abort_at is not None and now >= abort_at:
+                    # Manim would still spend seconds tearing down, the error is already known
+                    logger.info("Traceback in manim output, stopping the render early")
+                    process.kill()
+                    break
+                if not selector.select(timeout=min(deadline, abort_at or deadline) - now):
+                    continue
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                parser.feed(decoder.decode(data))
+                if parser.exception_seen and abort_at is None:
+                    abort_at = time.monotonic() + TRACEBACK_GRACE_PERIOD
         
-        # Look for the created video
-        media_dir = temp_dir / "media"
+        parser.feed(decoder.decode(b"", final=True))
+        process.wait()
+        process.stdout.close()
+        return parser.output
+
+    def _raise_limit_error(self, returncode: int, output: str):
+        limit_error = self.limits.classify_exit(returncode, output)
+        if limit_error is not None:
+            logger.warning(f"Render stopped by limit: {limit_error}")
+            raise limit_error
+
+    def _manim_cmd(self, code_file: Path, scene_name: str, quality: Optional[str] = None, *extra: str) -> list:
+        return [
+            "manim", "render",
+            str(code_file),
+            scene_name,
+            "--format", "mp4",
+            "-q", quality or self.quality,  # 'l'=low, 'm'=medium, 'h'=high, 'p'=4k, 'k'=8k
+            "--output_file", "video.mp4",
+            *extra,
+        ]
+
+    @staticmethod
+    def _clear_videos(work_dir: Path):
+        """Remove the movies of earlier renders in a session workspace, partial movies are reused"""
+        for folder in ("media", "segments"):
+            for f in (work_dir / folder).rglob("*.mp4"):
+                if "partial_movie_files" not in f.parts:
+                    f.unlink(missing_ok=True)
+
+    @staticmethod
+    def _find_video(media_dir: Path) -> Path:
+        """Locate the rendered movie in Manim's media folder"""
         if not media_dir.exists():
             raise FileNotFoundError("Media folder not found after running Manim")
         
-        # Search for mp4 file recursively
-        video_files = list(media_dir.rglob("*.mp4"))
+        # Search for mp4 file recursively, partial movies are only building blocks
+        video_files = [f for f in media_dir.rglob("*.mp4") if "partial_movie_files" not in f.parts]
         if not video_files:
             raise FileNotFoundError("Video file not found after rendering")
         
@@ -86,8 +323,187 @@ class VideoExecutor:
         
         return video_file
 
+    def _run_manim_segmented(
+        self,
+        code_file: Path,
+        scene_name: str,
+        temp_dir: Path,
+        ranges: list,
+        job: Optional[RenderJob] = None,
+        quality: Optional[str] = None,
+    ) -> Path:
+        """Render animation ranges in parallel processes and join them without re-encoding"""
+        logger.info(f"Rendering {len(ranges)} segments in parallel: {ranges}")
+        
+        segments_dir = temp_dir / "segments"
+        processes = []
+        for i, (start, end) in enumerate(ranges):
+            cmd = self._manim_cmd(
+                code_file, scene_name, quality,
+                "--media_dir", str(segments_dir / str(i)),
+                "-n", f"{start},{end}",
+            )
+            processes.append(self._spawn_manim(cmd, temp_dir, job))
+        
+        # Drain every pipe concurrently so that no segment blocks on a full buffer
+        try:
+            with ThreadPoolExecutor(max_workers=len(processes)) as executor:
+                outputs = list(executor.map(lambda p: p.communicate(timeout=self.limits.timeout), processes))
+        except subprocess.TimeoutExpired:
+            for process in processes:
+                process.kill()
+                process.communicate()
+            raise RenderLimitError("timeout", f"{self.limits.timeout} s")
+        
+        if job is not None:
+            job.check_cancelled()
+        failed = [(process.returncode, stderr) for process, (_, stderr) in zip(processes, outputs) if process.returncode != 0]
+        if failed:
+            returncode, stderr = failed[0]
+            logger.error(f"Manim execution error: {stderr}")
+            self._raise_limit_error(returncode, stderr)
+            raise RuntimeError(f"Manim exited with error: {stderr}")
+        
+        logger.info("Manim segments executed successfully")
+        
+        reused = sum(self._segment_reuse(stdout + stderr)[0] for stdout, stderr in outputs)
+        total = ranges[-1][1] + 1
+        logger.info(f"Reused {reused} of {total} cached animation segments")
+        if job is not None:
+            job.report.update(reused_segments=reused, total_segments=total)
+        
+        segment_files = [self._find_video(segments_dir / str(i)) for i in range(len(ranges))]
+        return concat_videos(segment_files, temp_dir / "video_segmented.mp4")
+
+    def _run_manim_warm(
+        self,
+        code_file: Path,
+        scene_name: str,
+        temp_dir: Path,
+        job: Optional[RenderJob] = None,
+        quality: Optional[str] = None,
+    ) -> Path:
+        """Render in a pre-imported worker process instead of spawning the manim CLI"""
+        logger.info(f"Rendering {code_file} in a warm worker")
+        
+        result = self.warm_pool.render(code_file, scene_name, temp_dir, quality or self.quality, self.limits, job)
+        if job is not None:
+            job.check_cancelled()
+            job.report.update(reused_segments=result["reused_segments"], total_segments=result["total_segments"])
+        
+        video_file = Path(result["video"])
+        if not video_file.exists():
+            # A scene without animations is saved as an image
+            raise FileNotFoundError("Video file not found after rendering")
+        logger.info(f"Video file found: {video_file}")
+        return video_file
+
+    @staticmethod
+    def _segment_reuse(output: str) -> tuple[int, int]:
+        """Count animations Manim took from its partial movie cache"""
+        reused = len(re.findall(r"Using cached data", output))
+        played = re.search(r"Played (\d+) animations", output)
+        total = int(played.group(1)) if played else reused
+        return reused, total
+
+    def _music_settings(self) -> dict:
+        """Music parameters that affect the rendered output (part of the cache key)"""
+        if not self.music_file.exists():
+            return {"file": None}
+        stat = self.music_file.stat()
+        return {
+            "file": str(self.music_file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "volume": self.music_volume,
+        }
+
     def _add_background_music(self, video_file: Path, temp_dir: Path) -> Path:
         """Add background music to the video"""
+        if self.mux_mode == "ffmpeg" and shutil.which("ffmpeg") and shutil.which("ffprobe"):
+            try:
+                return self._mux_background_music(video_file, temp_dir)
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                logger.warning(f"Fast music muxing failed, falling back to MoviePy: {e}")
+        return self._add_background_music_moviepy(video_file, temp_dir)
+
+    def _encoded_music(self) -> Path:
+        """AAC encoded, volume-scaled music track, encoded once and reused for every video"""
+        settings = self._music_settings()
+        digest = hashlib.sha256(repr(sorted(settings.items())).encode()).hexdigest()[:16]
+        music_track = self.music_cache_dir / f"music_{digest}.m4a"
+        with self._music_lock:
+            if not music_track.exists():
+                self.music_cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_track = music_track.with_name(f"tmp_{music_track.name}")
+                subprocess.run(
+                    [
+                        "ffmpeg", "-y", "-v", "error",
+                        "-i", str(self.music_file),
+                        "-vn", "-af", f"volume={self.music_volume}",
+                        "-c:a", "aac", "-b:a", "128k",
+                        str(tmp_track),
+                    ],
+                    check=True,
+                    capture_output=True,
+                )
+                os.replace(tmp_track, music_track)
+                logger.info(f"Background music encoded: {music_track}")
+        return music_track
+
+    @staticmethod
+    def _probe(video_file: Path) -> tuple[float, bool]:
+        """Return duration of the video and whether it has an audio stream"""
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries", "format=duration:stream=codec_type",
+                "-of", "default=noprint_wrappers=1",
+                str(video_file),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        duration = re.search(r"duration=([\d.]+)", result.stdout)
+        if not duration:
+            raise ValueError(f"Could not read duration of {video_file}")
+        return float(duration.group(1)), "codec_type=audio" in result.stdout
+
+    def _mux_background_music(self, video_file: Path, temp_dir: Path) -> Path:
+        """Attach the looped music track copying the video stream as is"""
+        logger.info("Muxing background music into video")
+        
+        video_with_music = temp_dir / "video_with_music.mp4"
+        duration, has_audio = self._probe(video_file)
+        
+        cmd = [
+            "ffmpeg", "-y", "-v", "error",
+            "-i", str(video_file),
+            "-stream_loop", "-1", "-i", str(self._encoded_music()),
+            "-t", f"{duration:.3f}",
+            "-map", "0:v:0",
+        ]
+        if has_audio:
+            # The original audio has to be mixed, so only the audio gets encoded
+            cmd += [
+                "-filter_complex", "[0:a][1:a]amix=inputs=2:duration=first:normalize=0[a]",
+                "-map", "[a]", "-c:a", "aac",
+            ]
+        else:
+            cmd += ["-map", "1:a:0", "-c:a", "copy"]
+        cmd += ["-c:v", "copy", "-movflags", "+faststart", str(video_with_music)]
+        
+        subprocess.run(cmd, check=True, capture_output=True)
+        
+        logger.info(f"Background music added: {video_with_music}")
+        return video_with_music
+
+    def _add_background_music_moviepy(self, video_file: Path, temp_dir: Path) -> Path:
+        """Add background music re-encoding the whole video with MoviePy"""
+        # moviepy.editor pulls in numpy, imageio and friends, only the fallback needs it
+        from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip, concatenate_audioclips
+
         logger.info("Adding background music to video")
         
         video_with_music = temp_dir / "video_with_music.mp4"
@@ -107,7 +523,7 @@ class VideoExecutor:
             music = concatenate_audioclips([music] * loops_needed).subclip(0, video_duration)
         
         # Set music volume lower to not overpower original audio (if any)
-        music = music.volumex(0.3)  # 30% volume
+        music = music.volumex(self.music_volume)
         
         # Combine original audio with music
         if video.audio is not None:
@@ -126,15 +542,3 @@ class VideoExecutor:
         
         logger.info(f"Background music added: {video_with_music}")
         return video_with_music
-
-    def _copy_to_output(self, video_file: Path) -> Path:
-        """Copy video to the output folder with a unique name"""
-        
-        import time
-        timestamp = int(time.time())
-        output_file = self.output_dir / f"video_{timestamp}.mp4"
-        
-        shutil.copy2(video_file, output_file)
-        logger.info(f"Video copied to: {output_file}")
-        
-        return output_file  
\ No newline at end of file
@@ -0,0 +1,194 @@
+import importlib.util
+import multiprocessing
+import os
+import queue
+import resource
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+from .render_pool import RenderJob
+from .render_limits import THREAD_ENV_VARS, RenderLimitError, RenderLimits
+
+# `manim render -q X` flags mapped to config presets
+QUALITY_PRESETS = {
+    "l": "low_quality",
+    "m": "medium_quality",
+    "h": "high_quality",
+    "p": "production_quality",
+    "k": "fourk_quality",
+}
+
+# Imported once by the fork server, every worker forks with them already loaded
+PRELOAD_MODULES = ["numpy", "manim", "manim_ml", "manim_video_generator.warm_renderer"]
+
+
+def _render_scene(code_file: str, scene_name: str, work_dir: str, quality: str, limits: RenderLimits) -> dict:
+    """Render a scene inside the (already warm) worker process"""
+    from manim import tempconfig
+
+    # The worker outlives renders, so the CPU limit counts from what it has used so far
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limits.apply(0, cpu_used=usage.ru_utime + usage.ru_stime)
+
+    work_path = Path(work_dir)
+    os.chdir(work_path)
+    media_dir = work_path / "media"
+    cached_before = {f.stem for f in media_dir.rglob("partial_movie_files/**/*.mp4")}
+
+    # Same layout as the CLI (media/videos/scene/<quality>/video.mp4) so both backends share partial movies
+    with tempconfig({
+        "quality": QUALITY_PRESETS[quality],
+        "media_dir": str(media_dir),
+        "input_file": code_file,
+        "output_file": "video",
+        "format": "mp4",
+    }):
+        spec = importlib.util.spec_from_file_location("scene", code_file)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        scene = getattr(module, scene_name)()
+        scene.render()
+        renderer = scene.renderer
+
+    hashes = [h for h in renderer.animations_hashes if h]
+    return {
+        "video": str(renderer.file_writer.movie_file_path),
+        "reused_segments": sum(1 for h in hashes if h in cached_before),
+        "total_segments": renderer.num_plays,
+    }
+
+
+def _max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker_main(conn, max_renders: int, max_rss_mb: float):
+    """Serve render requests until recycled"""
+    renders = 0
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = {"ok": True, **_render_scene(**request)}
+        except BaseException as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+        renders += 1
+        # Scenes leak module state and memory, so a worker only lives for a while
+        result["recycle"] = renders >= max_renders or _max_rss_mb() > max_rss_mb
+        conn.send(result)
+        if result["recycle"]:
+            conn.close()
+            return
+
+
+class _Worker:
+    def __init__(self, ctx, max_renders: int, max_rss_mb: float):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, max_renders, max_rss_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+
+
+class WarmRenderPool:
+    """Long-lived render processes forked from a server that has manim imported
+
+    Saves the seconds every `manim render` CLI call spends importing manim,
+    numpy, cairo, pango and manim-ml.
+    """
+
+    def __init__(self, size: int, max_renders: int = 20, max_rss_mb: float = 2048):
+        self.size = size
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        # The forkserver imports numpy with the environment of its start, pin BLAS threads first
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, "1")
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload(PRELOAD_MODULES)
+        self._slots: queue.Queue[Optional[_Worker]] = queue.Queue()
+        for _ in range(size):
+            self._slots.put(self._spawn())
+        logger.info(f"Warm render pool started with {size} workers")
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._ctx, self.max_renders, self.max_rss_mb)
+
+    def _checkout(self) -> _Worker:
+        worker = self._slots.get()
+        if worker is None or not worker.is_alive():
+            worker = self._spawn()
+        return worker
+
+    def _checkin(self, worker: Optional[_Worker]):
+        if worker is not None and not worker.is_alive():
+            worker = None
+        self._slots.put(worker)
+
+    def render(
+        self,
+        code_file: Path,
+        scene_name: str,
+        work_dir: Path,
+        quality: str,
+        limits: RenderLimits,
+        job: Optional[RenderJob] = None,
+    ) -> dict:
+        """Render in a warm worker, raising RuntimeError with the traceback on failure"""
+        worker = self._checkout()
+        try:
+            if job is not None:
+                job.attach_process(worker.process)
+            worker.conn.send({
+                "code_file": str(code_file),
+                "scene_name": scene_name,
+                "work_dir": str(work_dir),
+                "quality": quality,
+                "limits": limits,
+            })
+            if not worker.conn.poll(limits.timeout):
+                worker.stop()
+                raise RenderLimitError("timeout", f"{limits.timeout} s")
+            result = worker.conn.recv()
+            if result.pop("recycle"):
+                logger.info(f"Recycling render worker {worker.process.pid}")
+                worker.stop()
+        except (EOFError, OSError) as e:
+            worker.process.join(1)
+            exitcode = worker.process.exitcode
+            worker.stop()
+            if job is not None:
+                job.check_cancelled()
+            limit_error = limits.classify_exit(exitcode)
+            if limit_error is not None:
+                raise limit_error from e
+            raise RuntimeError(f"Render worker died: {e}") from e
+        finally:
+            if job is not None:
+                job.detach_process(worker.process)
+            self._checkin(worker)
+
+        if not result.pop("ok"):
+            limit_error = limits.classify_exit(None, result["traceback"])
+            if limit_error is not None:
+                raise limit_error
+            raise RuntimeError(f"Manim exited with error: {result['traceback']}")
+        return result
+
+    def shutdown(self):
+        while not self._slots.empty():
+            worker = self._slots.get_nowait()
+            if worker is not None:
+                worker.stop()
@@ -0,0 +1,10 @@
+from manim import *
+
+class VideoScene(Scene):
+    def construct(self):
+        axes = Axes(x_range=[0, 7], y_range=[-1.5, 1.5])
+        graph = axes.plot(lambda x: np.sin(x), color=GREEN)
+        label = Text("y = sin(x)").to_corner(UL)
+        self.play(Create(axes))
+        self.play(Create(graph), Write(label), run_time=3)
+        self.wait(2)
@@ -0,0 +1,11 @@
+from manim import *
+
+class VideoScene(Scene):
+    def construct(self):
+        title = Text("Pythagorean theorem").to_edge(UP)
+        triangle = Polygon(ORIGIN, 3 * RIGHT, 3 * RIGHT + 2 * UP, color=BLUE)
+        formula = Text("a² + b² = c²").next_to(triangle, DOWN)
+        self.play(Write(title))
+        self.play(Create(triangle), run_time=2)
+        self.play(FadeIn(formula))
+        self.wait(2)
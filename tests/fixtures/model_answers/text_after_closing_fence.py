@@ -0,0 +1,11 @@
+from manim import *
+
+class VideoScene(Scene):
+    def construct(self):
+        values = [5, 2, 4, 1, 3]
+        bars = VGroup(*[Rectangle(width=0.6, height=v * 0.6, fill_opacity=0.8) for v in values])
+        bars.arrange(RIGHT, aligned_edge=DOWN)
+        self.play(Create(bars))
+        for i in range(len(values)):
+            self.play(bars[i].animate.set_color(YELLOW), run_time=0.5)
+        self.wait(1)
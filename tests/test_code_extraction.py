@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from manim_video_generator.code_extraction import CodeBlockParser, extract_code
+
+# Model answers (<name>.md) and the code expected from them (<name>.py)
+ANSWERS_DIR = Path(__file__).resolve().parent / "fixtures" / "model_answers"
+ANSWERS = sorted(ANSWERS_DIR.glob("*.md"))
+
+
+def expected_code(answer: Path) -> str:
+    return answer.with_suffix(".py").read_text(encoding="utf-8").strip()
+
+
+def stream(text: str, chunk_size: int):
+    parser, early = CodeBlockParser(), None
+    for i in range(0, len(text), chunk_size):
+        code = parser.feed(text[i:i + chunk_size])
+        if code is not None:
+            early = code
+    return early, parser.close()
+
+
+@pytest.mark.parametrize("answer", ANSWERS, ids=lambda p: p.stem)
+def test_extract_code_from_answer(answer):
+    assert extract_code(answer.read_text(encoding="utf-8")) == expected_code(answer)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+@pytest.mark.parametrize("answer", ANSWERS, ids=lambda p: p.stem)
+def test_streamed_answer_matches_complete_one(answer, chunk_size):
+    early, code = stream(answer.read_text(encoding="utf-8"), chunk_size)
+    assert code == expected_code(answer)
+    if early is not None:
+        assert early == code
+
+
+def test_code_is_returned_before_the_answer_ends():
+    parser = CodeBlockParser()
+    assert parser.feed("Sure! ```python\nfrom manim import *\n") is None
+    assert parser.feed("```\n") == "from manim import *"
+    assert parser.feed("Some more explanation that is still streaming") is None
+
+
+def test_single_line_block():
+    assert extract_code("Run ```python print(1)``` to check") == "print(1)"
+
+
+def test_no_python_block():
+    with pytest.raises(ValueError):
+        extract_code("I can't help with that.")
+
+
+def test_lenient_takes_bare_or_unclosed_code():
+    assert extract_code("from manim import *", lenient=True) == "from manim import *"
+    assert extract_code("```python\nfrom manim import *\n", lenient=True) == "from manim import *"
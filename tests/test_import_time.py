@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.import_time import BUDGETS, measure
+
+# The modules are imported for real, so the app's dependencies have to be installed
+pytest.importorskip("loguru")
+
+
+@pytest.mark.parametrize("module", BUDGETS)
+def test_import_within_budget(module):
+    best, heavy = measure(module)
+    assert not heavy, f"{module} imports {', '.join(heavy)} at import time"
+    assert best <= BUDGETS[module], f"{module} takes {best:.0f} ms to import, budget {BUDGETS[module]} ms"